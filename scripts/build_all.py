@@ -0,0 +1,352 @@
+import os
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import yaml
+
+import zip_all_info
+import extract_game_info
+from extract_game_info import icon_bundle_extract, xdt_bundle_read
+from filter_game_info import load_filter_config, filter_sources, write_filtered_sources
+from extract_derived_info import derive_build
+
+STAGES = ["extract", "filter", "derive", "zip"]
+GANTT_WIDTH = 60
+# what a derivation of a full build holds at its peak, with some headroom
+DERIVE_MEMORY = 4 << 30
+
+# bounds the derivations running at once across the workers of build_all, set in every worker
+DERIVE_SLOTS = None
+
+
+def get_asset_digest(asset_dir: Path) -> str:
+    # the extracted tables only depend on the asset files and the code reading them
+    hasher = hashlib.sha256(Path(extract_game_info.__file__).read_bytes())
+
+    for path in sorted(p for p in asset_dir.rglob("*") if p.is_file()):
+        hasher.update(str(path.relative_to(asset_dir)).encode())
+
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def extract_stage(asset_dir: Path, out_dir: Path) -> dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # icons are written to their final place right away, excluded ones are removed from there by the filter
+    icon_bundle_extract(asset_dir, out_dir)
+    xdt, areas = xdt_bundle_read(asset_dir)
+    # stands in for the tables in the fingerprint of the cached filter ids
+    return {"areas": areas, "xdt": xdt, "digest": get_asset_digest(asset_dir)}
+
+
+def filter_stage(
+    config_root: Path,
+    build_config: dict,
+    out_dir: Path,
+    cache_root: Optional[Path],
+    profile_root: Optional[Path],
+    build_sources: dict,
+) -> dict:
+    build = out_dir.name
+    sources_digest = build_sources.pop("digest", None)
+    all_config = load_filter_config(
+        config_root / "how-exclude.yml",
+        config_root / f"exclude-{build}.yml",
+        config_root / f"extras-{build}.yml",
+    )
+    if all_config is not None:
+        build_sources = filter_sources(
+            all_config,
+            build_sources,
+            out_dir,
+            build_config.get("active_event", "None"),
+            cache_root / "filter-plans" if cache_root else None,
+            profile_root / f"{build}.json" if profile_root else None,
+            ids_cache_dir=cache_root / "filter-ids" if cache_root else None,
+            sources_digest=sources_digest,
+        )
+
+    # the filtered tables are only written once, as part of the zip
+    write_filtered_sources(out_dir, build_sources)
+    return build_sources
+
+
+def derive_stage(
+    config_root: Path,
+    build_config: dict,
+    out_dir: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path],
+    low_memory: bool,
+    stage_cache: bool,
+    build_sources: Optional[dict],
+):
+    derive_build(
+        config_root,
+        build_config,
+        out_dir,
+        server_data_root,
+        cache_root,
+        low_memory,
+        stage_cache=stage_cache,
+        build_sources=build_sources,
+    )
+
+
+def zip_stage(build_config: dict, out_dir: Path, artifact_root: Path) -> str:
+    return zip_all_info.zip_build(out_dir.name, build_config, out_dir, artifact_root)
+
+
+def run_timed(stage_func: Callable, *args) -> tuple[float, float, Any]:
+    start = time.time()
+    result = stage_func(*args)
+    return start, time.time(), result
+
+
+def get_build_weight(build_dir: Path) -> int:
+    return sum(p.stat().st_size for p in build_dir.rglob("*") if p.is_file())
+
+
+def get_stage_call(stage: str, job: dict, options: dict) -> tuple[Callable, tuple]:
+    out_dir = options["output_root"] / job["build"]
+    build_config = options["config"][job["build"]]
+
+    if stage == "extract":
+        return extract_stage, (job["asset_dir"], out_dir)
+    if stage == "filter":
+        return filter_stage, (
+            options["config_root"],
+            build_config,
+            out_dir,
+            options["cache_root"],
+            options["filter_profile_root"],
+            job["result"],
+        )
+    if stage == "derive":
+        return derive_stage, (
+            options["config_root"],
+            build_config,
+            out_dir,
+            options["server_data_root"],
+            options["cache_root"],
+            options["low_memory"],
+            options["stage_cache"],
+            job["result"],
+        )
+    return zip_stage, (build_config, out_dir, options["artifact_root"])
+
+
+def set_derive_slots(derive_slots: Any):
+    global DERIVE_SLOTS
+    DERIVE_SLOTS = derive_slots
+
+
+def run_build(job: dict, options: dict) -> tuple[str, list[tuple[str, str, float, float]]]:
+    # every stage of a build runs in the same worker, so its sources never leave the process
+    timings = []
+
+    for stage in job["stages"]:
+        stage_func, args = get_stage_call(stage, job, options)
+
+        if stage == "derive" and DERIVE_SLOTS is not None:
+            with DERIVE_SLOTS:
+                start, end, job["result"] = run_timed(stage_func, *args)
+        else:
+            start, end, job["result"] = run_timed(stage_func, *args)
+
+        timings.append((job["build"], stage, start, end))
+
+    return job["result"], timings
+
+
+def get_default_derive_workers(workers: int) -> int:
+    # as many derivations as fit in the memory available now, the other stages hold far less
+    try:
+        with open("/proc/meminfo", "r") as f:
+            meminfo = dict(line.split(":", 1) for line in f if ":" in line)
+        available = int(meminfo["MemAvailable"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        try:
+            available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, OSError, ValueError):
+            return 1
+
+    return max(1, min(workers, available // DERIVE_MEMORY))
+
+
+def schedule_builds(
+    jobs: list[dict],
+    workers: int,
+    derive_workers: int,
+    options: dict,
+) -> tuple[list[str], list[tuple[str, str, float, float]]]:
+    # a build waiting for a derivation slot keeps its worker, which bounds the builds in memory by workers
+    derive_slots = multiprocessing.Semaphore(derive_workers)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=set_derive_slots, initargs=(derive_slots,))
+    change_log = []
+    timings = []
+
+    try:
+        # the heaviest builds go first, so that none of them ends up last on the critical path
+        futures = [pool.submit(run_build, job, options) for job in sorted(jobs, key=lambda job: job["weight"], reverse=True)]
+
+        for future in as_completed(futures):
+            result, build_timings = future.result()
+            change_log.append(result)
+            timings.extend(build_timings)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    return change_log, timings
+
+
+def format_gantt(timings: list[tuple[str, str, float, float]], width: int = GANTT_WIDTH) -> str:
+    if not timings:
+        return ""
+
+    origin = min(start for _, _, start, _ in timings)
+    total = max(end for _, _, _, end in timings) - origin
+    scale = width / total if total > 0 else 0.0
+
+    builds = sorted({build for build, _, _, _ in timings}, key=lambda build: min(
+        start for timing_build, _, start, _ in timings if timing_build == build
+    ))
+    name_width = max(len(build) for build in builds)
+    lines = [f"{'':{name_width}}  0s{' ' * (width - 2 - len(f'{total:.0f}s'))}{total:.0f}s"]
+
+    for build in builds:
+        row = [" "] * width
+        busy_time = 0.0
+
+        for timing_build, stage, start, end in timings:
+            if timing_build != build:
+                continue
+
+            busy_time += end - start
+            first = min(int((start - origin) * scale), width - 1)
+            last = max(first + 1, min(int((end - origin) * scale), width))
+            row[first:last] = stage[0].upper() * (last - first)
+
+        lines.append(f"{build:{name_width}}  {''.join(row)}  {busy_time:.1f}s")
+
+    critical_path = max(
+        sum(end - start for timing_build, _, start, end in timings if timing_build == build)
+        for build in builds
+    )
+    lines.append(f"wall time {total:.1f}s, slowest build critical path {critical_path:.1f}s")
+    lines.append(", ".join(f"{stage[0].upper()} = {stage}" for stage in STAGES))
+    return "\n".join(lines)
+
+
+def main(
+    config_root: Path,
+    asset_root: Path,
+    output_root: Path,
+    artifact_root: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path] = None,
+    low_memory: bool = False,
+    stage_cache: bool = False,
+    workers: int = 1,
+    filter_profile_root: Optional[Path] = None,
+    derive_workers: Optional[int] = None,
+):
+    with open(config_root / "build-config.yml", "r") as f:
+        config = yaml.safe_load(f)["config"]
+
+    output_root.mkdir(parents=True, exist_ok=True)
+    artifact_root.mkdir(parents=True, exist_ok=True)
+    asset_dirs = [p for p in asset_root.iterdir() if p.is_dir()] if asset_root.is_dir() else []
+    asset_builds = {p.name for p in asset_dirs}
+
+    jobs = [
+        {"build": p.name, "asset_dir": p, "weight": get_build_weight(p), "stages": STAGES, "result": None}
+        for p in asset_dirs
+    ]
+    # builds restored from a previous zip by the planner only need their info derived again
+    jobs.extend(
+        {"build": p.name, "asset_dir": None, "weight": get_build_weight(p), "stages": STAGES[2:], "result": None}
+        for p in output_root.iterdir()
+        if p.is_dir() and p.name not in asset_builds
+    )
+
+    options = {
+        "config": config,
+        "config_root": config_root,
+        "output_root": output_root,
+        "artifact_root": artifact_root,
+        "server_data_root": server_data_root,
+        "cache_root": cache_root,
+        "low_memory": low_memory,
+        "stage_cache": stage_cache,
+        "filter_profile_root": filter_profile_root,
+    }
+    derive_workers = derive_workers or get_default_derive_workers(workers)
+    print(f"Building {len(jobs)} builds with {workers} workers, {derive_workers} of them deriving at once")
+    change_log, timings = schedule_builds(jobs, workers, derive_workers, options)
+
+    zip_all_info.write_change_log(artifact_root, change_log)
+    print(format_gantt(timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract, filter, derive and zip every build, pipelining builds through the stages.")
+    parser.add_argument("config_root", type=Path)
+    parser.add_argument("asset_root", type=Path)
+    parser.add_argument("output_root", type=Path)
+    parser.add_argument("artifact_root", type=Path)
+    parser.add_argument("server_data_root", type=Path)
+    parser.add_argument("cache_root", type=Path, nargs="?")
+    parser.add_argument("--low-memory", action="store_true", help="free intermediate data after the last stage reading it")
+    parser.add_argument(
+        "--stage-cache",
+        action="store_true",
+        help="reuse stage outputs from <cache_root>/stages when the inputs of the stage are unchanged",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="builds running at once, each runs all of its stages in one worker (default: number of cores)",
+    )
+    parser.add_argument(
+        "--derive-workers",
+        type=int,
+        help=(
+            "derivations running at once, each of them holds a whole build in memory "
+            "(default: as many as fit in the available memory, at most --workers)"
+        ),
+    )
+    parser.add_argument(
+        "--filter-profile",
+        type=Path,
+        metavar="PROFILE_ROOT",
+        help="write the time, rows and ids of every filter step to <PROFILE_ROOT>/<build>.json",
+    )
+    args = parser.parse_args()
+
+    if args.stage_cache and not args.cache_root:
+        parser.error("stage outputs are kept in <cache_root>, which is required for --stage-cache")
+
+    main(
+        args.config_root,
+        args.asset_root,
+        args.output_root,
+        args.artifact_root,
+        args.server_data_root,
+        args.cache_root,
+        args.low_memory,
+        args.stage_cache,
+        args.workers,
+        args.filter_profile,
+        args.derive_workers,
+    )
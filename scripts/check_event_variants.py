@@ -0,0 +1,152 @@
+import sys
+import json
+import shutil
+import argparse
+import filecmp
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from filter_game_info import ALL_EVENTS, apply_event_tables, filter_game_info, get_extras_events, read_sources
+from extract_derived_info import derive_build
+
+
+def compare_dirs(expected_dir: Path, got_dir: Path) -> list[str]:
+    expected_files = {p.relative_to(expected_dir) for p in expected_dir.rglob("*") if p.is_file()}
+    got_files = {p.relative_to(got_dir) for p in got_dir.rglob("*") if p.is_file()} if got_dir.is_dir() else set()
+
+    mismatches = [f"{p} is missing" for p in sorted(expected_files - got_files)]
+    mismatches.extend(f"{p} is extra" for p in sorted(got_files - expected_files))
+    mismatches.extend(
+        f"{p} differs"
+        for p in sorted(expected_files & got_files)
+        if not filecmp.cmp(expected_dir / p, got_dir / p, shallow=False)
+    )
+    return mismatches
+
+
+def filter_and_derive(
+    config_root: Path,
+    build_config: dict,
+    in_dir: Path,
+    out_dir: Path,
+    server_data_root: Path,
+    active_event: str,
+    in_sources: dict,
+    sources_digest: str,
+):
+    shutil.rmtree(out_dir, ignore_errors=True)
+    build = in_dir.name
+
+    filtered_sources = filter_game_info(
+        config_root / "how-exclude.yml",
+        config_root / f"exclude-{build}.yml",
+        config_root / f"extras-{build}.yml",
+        in_dir,
+        out_dir,
+        active_event,
+        link_mode="hardlink",
+        in_sources=in_sources,
+        sources_digest=sources_digest,
+    )
+    derive_build(
+        config_root,
+        {**build_config, "active_event": active_event},
+        out_dir,
+        server_data_root,
+        build_sources=filtered_sources,
+    )
+
+
+def check_build(config_root: Path, build_config: dict, in_dir: Path, server_data_root: Path, work_root: Path) -> list[str]:
+    build = in_dir.name
+    extras_path = config_root / f"extras-{build}.yml"
+    extras = {}
+    if extras_path.is_file():
+        with open(extras_path, "r") as f:
+            extras = yaml.safe_load(f)
+
+    in_sources, sources_digest = read_sources(in_dir)
+    all_dir = work_root / ALL_EVENTS.lower() / build
+    filter_and_derive(config_root, build_config, in_dir, all_dir, server_data_root, ALL_EVENTS, in_sources, sources_digest)
+
+    with open(all_dir / "areas.json", "r") as f:
+        areas = json.load(f)
+
+    with open(all_dir / "xdt.json", "r") as f:
+        xdt = json.load(f)
+
+    mismatches = []
+
+    # every variant of the All build has to match the build filtered and derived for that event alone
+    for event in get_extras_events(extras):
+        suffix = "" if event == "None" else f"-{event.lower()}"
+        event_dir = work_root / event.lower() / build
+        filter_and_derive(config_root, build_config, in_dir, event_dir, server_data_root, event, in_sources, sources_digest)
+
+        event_tables = {"xdt": {}}
+        if suffix and (all_dir / f"tables{suffix}.json").is_file():
+            with open(all_dir / f"tables{suffix}.json", "r") as f:
+                event_tables = json.load(f)
+
+        with open(event_dir / "areas.json", "r") as f:
+            event_areas = json.load(f)
+
+        with open(event_dir / "xdt.json", "r") as f:
+            event_xdt = json.load(f)
+
+        variant_sources = apply_event_tables({"areas": areas, "xdt": xdt}, event_tables)
+        if variant_sources["areas"] != event_areas:
+            mismatches.append(f"{build} {event}: filtered areas differ")
+
+        mismatches.extend(
+            f"{build} {event}: filtered table {table} differs"
+            for table in sorted(set(variant_sources["xdt"]) | set(event_xdt))
+            if variant_sources["xdt"].get(table) != event_xdt.get(table)
+        )
+        mismatches.extend(
+            f"{build} {event}: info{suffix}/{mismatch}"
+            for mismatch in compare_dirs(event_dir / "info", all_dir / f"info{suffix}")
+        )
+
+    return mismatches
+
+
+def main(config_root: Path, in_root: Path, server_data_root: Path, work_root: Path, builds: Optional[list[str]] = None):
+    with open(config_root / "build-config.yml", "r") as f:
+        config = yaml.safe_load(f)["config"]
+
+    builds = builds or sorted(p.name for p in in_root.iterdir() if p.is_dir() and p.name in config)
+    mismatches = []
+
+    for build in builds:
+        mismatches.extend(check_build(config_root, config[build], in_root / build, server_data_root, work_root))
+
+    for mismatch in mismatches:
+        print(mismatch)
+
+    if mismatches:
+        sys.exit(1)
+
+    print(f"Every event variant of {', '.join(builds)} matches its single event build")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the builds filtered and derived with active_event All match one build per event."
+    )
+    parser.add_argument("config_root", type=Path)
+    parser.add_argument("in_root", type=Path, help="the extracted, unfiltered builds")
+    parser.add_argument("server_data_root", type=Path)
+    parser.add_argument("work_root", type=Path, help="where the builds are filtered and derived, one folder per event")
+    parser.add_argument(
+        "--build",
+        action="append",
+        dest="builds",
+        metavar="BUILD",
+        help="only check this build, can be repeated (default: every build in <in_root>)",
+    )
+    args = parser.parse_args()
+
+    main(args.config_root, args.in_root, args.server_data_root, args.work_root, args.builds)
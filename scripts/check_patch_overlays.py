@@ -0,0 +1,100 @@
+import sys
+import json
+import random
+import argparse
+from copy import deepcopy
+from typing import Any
+
+from extract_derived_info import apply_patch_overlay, compile_patch, compose_patch_overlays, patch
+
+KEYS = ["a", "b", "c"]
+# chains that once disagreed with patching one by one
+KNOWN_CHAINS = [
+    ({"a": [1, 9]}, [{"a": []}, {"a": {}}, {"a": 1}]),
+    ({"a": 5}, [{"a": [1]}, {"!a": 2}]),
+    ({"a": [1]}, [{"a": {"b": 1}}, {"a": None}]),
+    ({"a": {"b": 5}}, [{"a": {"b": [1]}}, {"!a": {}}]),
+    ({"a": [1]}, [{"a": {"b": None}}, {"a": [2]}]),
+]
+
+
+def get_random_value(rng: random.Random, depth: int, is_patch: bool) -> Any:
+    kinds = ["none", "int", "str", "list", "dict"] if depth < 3 else ["none", "int", "str", "list"]
+    kind = rng.choice(kinds)
+
+    if kind == "none":
+        return None
+
+    if kind == "int":
+        return rng.randint(0, 9)
+
+    if kind == "str":
+        # strings can hold a key, which patch then finds with "in"
+        return rng.choice(["a", "bc", "x"])
+
+    if kind == "list":
+        return [rng.choice([rng.randint(0, 9), "a"]) for _ in range(rng.randint(0, 2))]
+
+    return get_random_dict(rng, depth + 1, is_patch)
+
+
+def get_random_dict(rng: random.Random, depth: int, is_patch: bool) -> dict:
+    keys = KEYS + [f"!{key}" for key in KEYS] if is_patch else KEYS
+    return {key: get_random_value(rng, depth, is_patch) for key in rng.sample(keys, rng.randint(0, 3))}
+
+
+def get_result(base: dict, patches: list[dict], composed: bool) -> tuple[str, Any]:
+    base = deepcopy(base)
+
+    try:
+        if composed:
+            overlay = {}
+            for patch_index, patch_obj in enumerate(patches):
+                overlay = compose_patch_overlays(overlay, compile_patch(deepcopy(patch_obj), patch_index))
+
+            apply_patch_overlay(base, overlay)
+        else:
+            for patch_obj in patches:
+                patch(base, deepcopy(patch_obj))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return ("error", None)
+
+    # dumped without sorting, so that key order counts too
+    return ("ok", json.dumps(base))
+
+
+def main(cases: int, seed: int):
+    rng = random.Random(seed)
+    chains = list(KNOWN_CHAINS)
+
+    for _ in range(cases):
+        chains.append((get_random_dict(rng, 0, False), [get_random_dict(rng, 0, True) for _ in range(rng.randint(1, 4))]))
+
+    mismatches = []
+
+    for base, patches in chains:
+        expected = get_result(base, patches, composed=False)
+        got = get_result(base, patches, composed=True)
+
+        if expected != got:
+            mismatches.append(f"base {base!r}, patches {patches!r}: patching one by one gives {expected}, the overlay {got}")
+
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+
+    if mismatches:
+        print(f"{len(mismatches)} of {len(chains)} chains differ")
+        sys.exit(1)
+
+    print(f"The overlays of all {len(chains)} chains match patching one by one")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that composed patch overlays apply exactly like the patches one by one, failures included."
+    )
+    parser.add_argument("--cases", type=int, default=30000, help="number of random chains to check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.cases, args.seed)
@@ -1,21 +1,32 @@
 import csv
 import sys
 import json
+import argparse
+import hashlib
 import math
+import pickle
 import random
+import sqlite3
 import warnings
+import subprocess
 from collections import defaultdict
+from collections.abc import Mapping
+from copy import deepcopy
 from fractions import Fraction
+from functools import partial
 from itertools import groupby
 from operator import itemgetter
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
 
 import yaml
 import humanize
 import networkx as nx
-import matplotlib.pyplot as plt
 from tqdm import tqdm
 
+from filter_game_info import ALL_EVENTS, get_extras_events
+
 SEP = "::"
 WORLD_INSTANCE_ID = 0
 NPC_ID_OFFSET = 1
@@ -261,6 +272,192 @@ SOURCE_TYPE_NAME_FIELD_MAP = {
 WRONG_DIALOG_BUBBLE_IDS = {
     21822: 12822,
 }
+SERVER_DATA_NAMES = {
+    "mobs": "mobs",
+    "drops": "drops",
+    "eggs": "eggs",
+    "npcs": "NPCs",
+    "paths": "paths",
+}
+# one entry per server data folder and patch list (and file for the overlays), replaced when their files change,
+# so that watch mode does not keep every version it derived
+SERVER_DATA_CACHE = {}
+PATCH_OVERLAY_CACHE = {}
+JSON_EXPORT_KEYS = [
+    "player_info",
+    "item_info",
+    "npc_type_info",
+    "mob_type_info",
+    "npc_info",
+    "mob_info",
+    "egg_type_info",
+    "egg_info",
+    "mission_info",
+    "instance_info",
+    "nano_info",
+    "area_info",
+    "vendor_info",
+    "infected_zone_info",
+    "code_item_info",
+    "transportation_info",
+    "combination_info",
+    "item_source_info",
+    "source_item_info",
+    "crate_to_item_info",
+    "item_to_crate_info",
+]
+CSV_EXPORT_KEYS = [
+    "player_info",
+    "item_info",
+    "code_item_info",
+    "egg_info",
+    "egg_type_info",
+    "infected_zone_info",
+    "instance_info",
+    "mission_info",
+    "mob_info",
+    "mob_type_info",
+    "nano_info",
+    "npc_info",
+    "npc_type_info",
+    "transportation_info",
+    "vendor_info",
+    "combination_info",
+    "mob_instance_region_grouped_info",
+    "crate_to_item_info",
+    "source_item_info",
+    "item_to_crate_info",
+    "item_source_info",
+]
+SQLITE_EXPORT_KEYS = [
+    "item_info",
+    "npc_type_info",
+    "mob_type_info",
+    "egg_type_info",
+    "npc_info",
+    "mob_info",
+    "egg_info",
+    "area_info",
+    "instance_info",
+    "mission_info",
+    "crate_to_item_info",
+    "item_source_info",
+]
+SQLITE_TYPES = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT"}
+# every sources key (xdt tables as "xdt.<table>") each stage reads, used to free keys after their last reader
+STAGE_READS = {
+    "construct_drop_directory_data": [],
+    "construct_area_data": ["areas"],
+    "construct_player_info_data": ["xdt.m_pAvatarTable", "is_retrobution", "is_academy"],
+    "construct_item_info_data": [f"xdt.{table}" for table in ITEM_TABLES if table],
+    "construct_npc_mob_info_data": [
+        "xdt.m_pVendorTable", "xdt.m_pNpcTable", "xdt.m_pSkillTable", "xdt.m_pMissionTable", "item_info", "drops_map",
+        "npcs", "mobs", "area_info", "extra_npcs", "extra_mobs", "active_event",
+    ],
+    "construct_egg_data": [
+        "eggs", "xdt.m_pShinyTable", "xdt.m_pSkillTable", "item_info", "area_info", "extra_eggs", "active_event",
+    ],
+    "construct_mission_data": [
+        "xdt.m_pMissionTable", "xdt.m_pNpcTable", "xdt.m_pInstanceTable", "xdt.m_pNanoTable", "xdt.m_pQuestItemTable",
+        "npc_mob_type_info", "item_info", "player_info", "is_retrobution",
+    ],
+    "construct_instance_data": [
+        "xdt.m_pInstanceTable", "xdt.m_pMissionTable", "npc_type_info", "npc_info", "area_info", "item_info",
+    ],
+    "construct_transportation_data": [
+        "paths", "xdt.m_pTransportationTable", "area_info", "npc_mob_type_info", "npc_mob_info",
+    ],
+    "construct_nano_data": ["xdt.m_pNanoTable", "xdt.m_pSkillTable", "item_info", "player_info"],
+    "construct_vendor_data": ["xdt.m_pVendorTable", "npc_info", "item_info"],
+    "construct_ep_instance_data": ["instance_info", "drops_map", "item_info"],
+    "construct_code_item_data": ["drops_map", "item_info"],
+    "construct_combination_data": ["xdt.m_pCombiningTable"],
+    "construct_egg_instance_region_grouped_data": ["egg_info"],
+    "construct_npc_instance_region_grouped_data": ["npc_info"],
+    "construct_mob_instance_region_grouped_data": ["mob_info"],
+    "construct_code_item_source_data": ["code_item_info"],
+    "construct_vendor_source_data": ["vendor_info", "npc_type_info", "npc_instance_region_grouped_info"],
+    "construct_racing_source_data": ["infected_zone_info", "npc_type_info", "npc_instance_region_grouped_info"],
+    "construct_mob_event_source_data": [
+        "drops_map", "references", "mob_type_info", "mob_instance_region_grouped_info",
+    ],
+    "construct_mission_reward_source_data": ["mission_info", "npc_mob_type_info", "npc_instance_region_grouped_info"],
+    "construct_egg_source_data": ["egg_type_info", "egg_instance_region_grouped_info"],
+    "construct_crate_item_source_data": ["drops_map", "item_info"],
+    "construct_crate_source_data": [
+        "item_info", "code_item_source_info", "vendor_source_info", "egg_source_info", "racing_source_info",
+        "mob_source_info", "event_source_info", "mission_reward_source_info",
+    ],
+    "construct_item_source_data": [
+        "item_info", "code_item_source_info", "vendor_source_info", "mission_reward_source_info",
+        "item_to_crate_info", "crate_source_info",
+    ],
+    "construct_source_item_data": ["item_source_info", "item_info"],
+    "fill_area_info": [
+        "npc_instance_region_grouped_info", "mob_instance_region_grouped_info", "egg_instance_region_grouped_info",
+        "area_info", "npc_type_info", "mob_type_info", "egg_type_info", "vendor_info", "transportation_info",
+        "instance_warp_info", "infected_zone_info",
+    ],
+    "construct_valid_id_sets": [
+        "npcs", "mobs", "eggs", "extra_npcs", "extra_mobs", "extra_eggs", "active_event", "npc_info", "mob_info",
+        "egg_info", "vendor_info", "npc_mob_type_info", "mission_info", "instance_warp_info", "instance_info",
+        "infected_zone_info", "transportation_info", "item_info", "item_source_info",
+    ],
+    "mark_valid_sources": [
+        "npc_type_info", "mob_type_info", "egg_type_info", "mission_info", "instance_info", "infected_zone_info",
+        "transportation_info", "vendor_info", "item_info", "valid_npc_types", "valid_mob_types", "valid_egg_types",
+        "valid_missions", "valid_instances", "valid_infected_zones", "valid_transportations", "valid_vendors",
+        "valid_items",
+    ],
+    "stringify_item_keys": [
+        "vendor_info", "code_item_info", "source_item_info", "item_source_info", "item_to_crate_info", "item_info",
+    ],
+    "export_json_source_info": JSON_EXPORT_KEYS,
+    "export_csv_source_info": CSV_EXPORT_KEYS,
+    "export_sqlite_source_info": SQLITE_EXPORT_KEYS,
+    "export_graph_source_info": ["mission_info"],
+}
+# every sources key each cached stage creates or updates, restored together on a stage cache hit
+# mark_valid_sources and stringify_item_keys update records shared by most tables, so they always run
+STAGE_WRITES = {
+    "construct_area_data": ["area_info"],
+    "construct_player_info_data": ["player_info"],
+    "construct_item_info_data": ["item_info"],
+    "construct_npc_mob_info_data": [
+        "npc_type_info", "mob_type_info", "npc_mob_type_info", "npc_info", "mob_info", "npc_mob_info",
+    ],
+    "construct_egg_data": ["egg_type_info", "egg_info"],
+    "construct_mission_data": ["mission_info", "player_info"],
+    "construct_instance_data": ["instance_info", "instance_warp_info"],
+    "construct_transportation_data": ["transportation_info", "transportation_path_info"],
+    "construct_nano_data": ["nano_info", "nano_power_info", "player_info"],
+    "construct_vendor_data": ["vendor_info"],
+    "construct_ep_instance_data": ["infected_zone_info"],
+    "construct_code_item_data": ["code_item_info"],
+    "construct_combination_data": ["combination_info"],
+    "construct_egg_instance_region_grouped_data": ["egg_instance_region_grouped_info"],
+    "construct_npc_instance_region_grouped_data": ["npc_instance_region_grouped_info"],
+    "construct_mob_instance_region_grouped_data": ["mob_instance_region_grouped_info"],
+    "construct_code_item_source_data": ["code_item_source_info"],
+    "construct_vendor_source_data": ["vendor_source_info"],
+    "construct_racing_source_data": ["racing_source_info"],
+    "construct_mob_event_source_data": ["mob_source_info", "event_source_info"],
+    "construct_mission_reward_source_data": ["mission_reward_source_info"],
+    "construct_egg_source_data": ["egg_source_info"],
+    "construct_crate_item_source_data": ["crate_to_item_info", "item_to_crate_info"],
+    "construct_crate_source_data": ["crate_source_info"],
+    "construct_item_source_data": ["item_source_info"],
+    "construct_source_item_data": ["source_item_info"],
+    # only fills the area records, which nothing else holds on to
+    "fill_area_info": ["area_info"],
+    "construct_valid_id_sets": [
+        "valid_npcs", "valid_mobs", "valid_eggs", "valid_npc_types", "valid_mob_types", "valid_egg_types",
+        "valid_npc_mobs", "valid_npc_mob_types", "valid_missions", "valid_instance_warps", "valid_instances",
+        "valid_infected_zones", "valid_transportations", "valid_vendors", "valid_items",
+    ],
+}
+# changes to the derivation code invalidate every cached stage output
+SCRIPT_DIGEST = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
 
 
 def patch(base_obj: dict, patch_obj: dict) -> None:
@@ -282,18 +479,221 @@ def patch(base_obj: dict, patch_obj: dict) -> None:
             base_obj[key] = value
 
 
-def get_patched(server_data_dir: Path, name: str, patch_names: list[str]) -> dict:
-    with open(server_data_dir / f"{name}.json") as r:
-        base_obj = json.load(r)
+def compile_patch(patch_obj: dict, patch_index: int = 0) -> dict[str, tuple]:
+    # the same as calling patch with every patch in order, but composed once and applied in a single pass
+    # every key maps to a pair of steps, one for when the key is present in the base and one for when it is not
+    # steps are ("set", value), ("reset", value) (delete then add back), ("delete",), ("extend", list), ("merge", overlay),
+    # ("check", step, then) (apply step to the base value, which may fail, then carry on with then)
+    # and ("invalid", message) for combinations that fail whatever the base holds
+    # steps that add a key carry the position of the patch that added it, so that key order matches patching one by one
+    overlay = {}
+
+    for position, (key, value) in enumerate(patch_obj.items()):
+        rank = (patch_index, position)
+
+        if not key:
+            # patch reads the first character of every key it applies
+            op = (("invalid", "Patch keys cannot be empty."), ("invalid", "Patch keys cannot be empty."))
+        elif key[0] == "!":
+            key = key[1:]
+            op = (("set", value, rank), ("set", value, rank))
+        elif value is None:
+            op = (("delete",), ("set", None, rank))
+        elif isinstance(value, list):
+            op = (("extend", value), ("set", value, rank))
+        elif isinstance(value, dict):
+            op = (("merge", compile_patch(value, patch_index)), ("set", value, rank))
+        else:
+            op = (("set", value, rank), ("set", value, rank))
+
+        overlay[key] = compose_patch_ops(overlay[key], op) if key in overlay else op
+
+    return overlay
+
+
+def compose_patch_step(step: tuple, op: tuple, was_present: bool) -> tuple:
+    kind = step[0]
+    next_step = op[0]
+
+    # patching stops at the first failure, nothing after it can make up for it
+    if kind == "invalid":
+        return step
+
+    if kind == "check":
+        then = compose_patch_step(step[2], op, was_present)
+        return then if then[0] == "invalid" else ("check", step[1], then)
+
+    if kind == "delete":
+        next_step = op[1]
+
+        if next_step[0] in ["delete", "invalid"]:
+            return next_step
+
+        return ("reset" if was_present else "set", *next_step[1:])
+
+    if kind in ["set", "reset"]:
+        if next_step[0] == "delete":
+            return next_step
+
+        # the value is known here, so whether the next patch applies is known too
+        try:
+            value = deepcopy(step[1])
+
+            if next_step[0] == "check":
+                apply_patch_step(value, next_step[1])
+                next_step = next_step[2]
+
+                if next_step[0] == "delete":
+                    return next_step
+
+            value = apply_patch_step(value, next_step)
+        except (AttributeError, TypeError, ValueError) as e:
+            return ("invalid", str(e))
+
+        if next_step[0] == "reset":
+            return ("reset", value, next_step[2])
+
+        return (kind, value, step[2])
+
+    # extend and merge depend on the base value, which only a set or a delete replaces
+    if next_step[0] == "invalid":
+        return next_step
+
+    if next_step[0] in ["set", "reset", "delete"]:
+        return ("check", step, next_step)
 
-    for patch_name in patch_names:
-        patch_path = server_data_dir / "patch" / patch_name / f"{name}.json"
+    if next_step[0] == "check":
+        checked = compose_patch_step(step, (next_step[1],), was_present)
+        return checked if checked[0] == "invalid" else ("check", checked, next_step[2])
 
-        if patch_path.is_file():
-            with open(patch_path) as r:
-                patch_obj = json.load(r)
+    if kind == "extend" and next_step[0] == "extend":
+        return ("extend", step[1] + next_step[1])
 
-            patch(base_obj, patch_obj)
+    if kind == "merge" and next_step[0] == "merge":
+        return ("merge", compose_patch_overlays(step[1], next_step[1]))
+
+    # only a list can be extended, and a merge with any key fails on anything but a dict, so one of the two always fails
+    # unless the merge is empty, which leaves the base value as it is
+    merge_step = step if kind == "merge" else next_step
+    if not merge_step[1]:
+        return next_step if kind == "merge" else step
+
+    return ("invalid", f"Cannot apply a {next_step[0]} patch over a {kind} patch.")
+
+
+def compose_patch_ops(op: tuple, next_op: tuple) -> tuple:
+    return (
+        compose_patch_step(op[0], next_op, was_present=True),
+        compose_patch_step(op[1], next_op, was_present=False),
+    )
+
+
+def compose_patch_overlays(overlay: dict[str, tuple], next_overlay: dict[str, tuple]) -> dict[str, tuple]:
+    composed = dict(overlay)
+
+    for key, op in next_overlay.items():
+        composed[key] = compose_patch_ops(composed[key], op) if key in composed else op
+
+    return composed
+
+
+def apply_patch_step(value: Any, step: tuple) -> Any:
+    kind = step[0]
+
+    if kind == "invalid":
+        raise ValueError(step[1])
+
+    if kind in ["set", "reset"]:
+        # overlays are cached and shared, so never hand out their objects
+        return deepcopy(step[1])
+
+    if kind == "extend":
+        value.extend(deepcopy(step[1]))
+    else:
+        apply_patch_overlay(value, step[1])
+
+    return value
+
+
+def apply_patch_overlay(base_obj: dict, overlay: dict[str, tuple]) -> None:
+    # patch fails on the first key of a merge into anything but a dict
+    if overlay and not isinstance(base_obj, dict):
+        raise TypeError(f"Cannot apply a merge patch over a {type(base_obj).__name__} value.")
+
+    added = []
+
+    for key, (present_step, absent_step) in overlay.items():
+        if key not in base_obj:
+            if absent_step[0] == "invalid":
+                raise ValueError(absent_step[1])
+
+            if absent_step[0] != "delete":
+                added.append((absent_step[2], key, absent_step))
+            continue
+
+        if present_step[0] == "check":
+            # the value is replaced or deleted right after, but the patches before still have to apply to it
+            apply_patch_step(base_obj[key], present_step[1])
+            present_step = present_step[2]
+
+        if present_step[0] == "delete":
+            del base_obj[key]
+        elif present_step[0] == "reset":
+            del base_obj[key]
+            added.append((present_step[2], key, present_step))
+        else:
+            base_obj[key] = apply_patch_step(base_obj[key], present_step)
+
+    for _, key, step in sorted(added, key=itemgetter(0)):
+        base_obj[key] = apply_patch_step(None, step)
+
+
+def compile_patch_overlay(server_data_dir: Path, name: str, patch_names: list[str], cache_dir: Optional[Path] = None) -> dict[str, tuple]:
+    patch_contents = [
+        patch_path.read_bytes()
+        for patch_name in patch_names
+        if (patch_path := server_data_dir / "patch" / patch_name / f"{name}.json").is_file()
+    ]
+
+    if not patch_contents:
+        return {}
+
+    # overlays compiled by an older version of this script may compose differently
+    overlay_key = hashlib.sha256(
+        "\n".join([SCRIPT_DIGEST, *(hashlib.sha256(content).hexdigest() for content in patch_contents)]).encode()
+    ).hexdigest()
+
+    memory_key = (str(server_data_dir.resolve()), name, tuple(patch_names))
+
+    if memory_key in PATCH_OVERLAY_CACHE and PATCH_OVERLAY_CACHE[memory_key][0] == overlay_key:
+        return PATCH_OVERLAY_CACHE[memory_key][1]
+
+    cache_path = cache_dir / "patch_overlays" / f"{overlay_key}.pkl" if cache_dir else None
+
+    if cache_path and cache_path.is_file():
+        with open(cache_path, "rb") as f:
+            PATCH_OVERLAY_CACHE[memory_key] = (overlay_key, pickle.load(f))
+        return PATCH_OVERLAY_CACHE[memory_key][1]
+
+    overlay = {}
+    for patch_index, content in enumerate(patch_contents):
+        overlay = compose_patch_overlays(overlay, compile_patch(json.loads(content), patch_index))
+
+    PATCH_OVERLAY_CACHE[memory_key] = (overlay_key, overlay)
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump(overlay, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return overlay
+
+
+def get_patched(server_data_dir: Path, name: str, patch_names: list[str], cache_dir: Optional[Path] = None) -> dict:
+    with open(server_data_dir / f"{name}.json") as r:
+        base_obj = json.load(r)
+
+    apply_patch_overlay(base_obj, compile_patch_overlay(server_data_dir, name, patch_names, cache_dir))
 
     return base_obj
 
@@ -321,6 +721,60 @@ def to_area_tag(area_obj: dict) -> str:
     return "{AreaName} - {ZoneName}".format(**area_obj)
 
 
+def item_key(type_id: int, item_id: int) -> int:
+    # items are keyed by (type << 16) | id internally, the "TT::IIII" strings are only produced for the exports
+    return (type_id << 16) | item_id
+
+
+def item_key_str(key: int) -> str:
+    return f"{key >> 16:02d}{SEP}{key & 0xFFFF:04d}"
+
+
+class InstanceRecord(Mapping):
+    # read-only view with the same keys as the old per-instance dicts, expanded to a dict only when exported
+    __slots__ = ()
+    FIELDS = ()
+    FIELD_SET = frozenset()
+
+    def __init__(self, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, fields[field])
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+
+class NPCInstance(InstanceRecord):
+    FIELDS = ("ID", "TypeID", "TypeName", "TypeIcon", "X", "Y", "Z", "Angle", "InstanceID", "AreaZone")
+    FIELD_SET = frozenset(FIELDS)
+    __slots__ = FIELDS
+
+
+class MobInstance(InstanceRecord):
+    FIELDS = ("ID", "TypeID", "TypeName", "TypeIcon", "FollowsMobID", "HP", "X", "Y", "Z", "Angle", "InstanceID", "AreaZone")
+    FIELD_SET = frozenset(FIELDS)
+    __slots__ = FIELDS
+
+
+class EggInstance(InstanceRecord):
+    FIELDS = ("ID", "TypeID", "TypeName", "TypeComment", "TypeExtraComment", "X", "Y", "Z", "InstanceID", "AreaZone")
+    FIELD_SET = frozenset(FIELDS)
+    __slots__ = FIELDS
+
+
+def locate_area_tag(area_info: dict, x: int, y: int) -> str:
+    # there are only so many areas, so share the tag strings between instances
+    return sys.intern(to_area_tag(locate_coordinates(area_info, x, y)))
+
+
 def get_task_chains(sources: dict, mission_info_obj: dict, task_list: list[dict]) -> tuple[dict[int, str], list[dict]]:
     task_id_set = {task_obj["m_iHTaskID"] for task_obj in task_list}
     nano_mission_task_id_set = {sources["player_info"][level]["TaskAssignedAtFMFillID"] for level in sources["player_info"]}
@@ -402,17 +856,24 @@ def get_task_chains(sources: dict, mission_info_obj: dict, task_list: list[dict]
     return task_states, sorted_task_list
 
 
-def construct_drop_directory_data(sources: dict[str, dict], server_data_dir: Path, patch_names: list[str]) -> None:
-    sources["mobs"] = get_patched(server_data_dir, "mobs", patch_names)
-    sources["drops"] = get_patched(server_data_dir, "drops", patch_names)
-    sources["eggs"] = get_patched(server_data_dir, "eggs", patch_names)
-    sources["npcs"] = get_patched(server_data_dir, "NPCs", patch_names)
-    sources["paths"] = get_patched(server_data_dir, "paths", patch_names)
+def get_server_data_commit(server_data_dir: Path) -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=server_data_dir, capture_output=True, text=True)
+        status = subprocess.run(["git", "status", "--porcelain"], cwd=server_data_dir, capture_output=True, text=True)
+    except OSError:
+        return None
+
+    # uncommitted changes are not covered by the commit hash, so do not cache those
+    if commit.returncode != 0 or status.returncode != 0 or status.stdout.strip():
+        return None
+
+    return commit.stdout.strip()
 
-    sources["drops_map"] = mapify_drops(sources["drops"])
-    sources["references"] = defaultdict(set)
 
-    for alt_key, alt_dict in sources["drops_map"].items():
+def construct_references(drops_map: dict[str, dict[int | str, dict]]) -> defaultdict[tuple[str, int], set]:
+    references = defaultdict(set)
+
+    for alt_key, alt_dict in drops_map.items():
         lowest_id = INT_LOWER_BOUND_MAP.get(alt_key, -1)
 
         for int_key, data in alt_dict.items():
@@ -430,10 +891,71 @@ def construct_drop_directory_data(sources: dict[str, dict], server_data_dir: Pat
                     fk_main_key = FK_MAP_NAMES.get(
                         fk_type, fk_type.split("ID")[0] + "s"
                     )
-                    sources["references"][(fk_main_key, fk_id)].add(
+                    references[(fk_main_key, fk_id)].add(
                         (alt_key, int_key)
                     )
 
+    return references
+
+
+def load_server_data(
+    server_data_dir: Path,
+    patch_names: list[str],
+    cache_dir: Optional[Path] = None,
+    keep_in_memory: bool = True,
+) -> dict:
+    commit = get_server_data_commit(server_data_dir)
+    cache_key = (str(server_data_dir.resolve()), commit, tuple(patch_names))
+    memory_key = (cache_key[0], cache_key[2])
+
+    if keep_in_memory and commit and memory_key in SERVER_DATA_CACHE and SERVER_DATA_CACHE[memory_key][0] == commit:
+        return SERVER_DATA_CACHE[memory_key][1]
+
+    # the server data of a previous commit is not read again, and without keep_in_memory the caller frees it when done
+    SERVER_DATA_CACHE.pop(memory_key, None)
+    keep_in_memory = keep_in_memory and commit is not None
+
+    cache_path = None
+    if commit and cache_dir:
+        key_hash = hashlib.sha256(repr(cache_key).encode()).hexdigest()
+        cache_path = cache_dir / "server_data" / f"{key_hash}.pkl"
+
+        if cache_path.is_file():
+            with open(cache_path, "rb") as f:
+                server_data = pickle.load(f)
+
+            if keep_in_memory:
+                SERVER_DATA_CACHE[memory_key] = (commit, server_data)
+            return server_data
+
+    server_data = {
+        key: get_patched(server_data_dir, name, patch_names, cache_dir)
+        for key, name in SERVER_DATA_NAMES.items()
+    }
+    server_data["drops_map"] = mapify_drops(server_data["drops"])
+    server_data["references"] = construct_references(server_data["drops_map"])
+
+    if keep_in_memory:
+        SERVER_DATA_CACHE[memory_key] = (commit, server_data)
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump(server_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return server_data
+
+
+def construct_drop_directory_data(
+    sources: dict[str, dict],
+    server_data_dir: Path,
+    patch_names: list[str],
+    cache_dir: Optional[Path] = None,
+    keep_in_memory: bool = True,
+) -> None:
+    # the server data objects are shared between builds, treat them as read-only
+    sources.update(load_server_data(server_data_dir, patch_names, cache_dir, keep_in_memory))
+
 
 def construct_area_data(sources: dict) -> None:
     sources["area_info"] = defaultdict(list)
@@ -547,6 +1069,7 @@ def construct_item_info_data(sources: dict[str, dict]) -> None:
             item_id = obj["m_iItemNumber"]
             weapon_type_id = obj.get("m_iTargetMode", 0)
             str_id = f"{i:02d}{SEP}{item_id:04d}"
+            key = item_key(i, item_id)
             icon_id = obj["m_iIcon"]
             icon_obj = item_icon_list[icon_id] if icon_id < len(item_icon_list) else None
             str_obj = item_string_list[obj["m_iItemName"]]
@@ -595,7 +1118,7 @@ def construct_item_info_data(sources: dict[str, dict]) -> None:
                 except:
                     pass
 
-            sources["item_info"][str_id] = {
+            sources["item_info"][key] = {
                 "ID": str_id,
                 "ItemID": item_id,
                 "TypeID": i,
@@ -664,12 +1187,12 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
 
     for vendor_item_obj in vendor_item_list[1:]:
         npc_type_id = vendor_item_obj["m_iNpcNumber"]
-        item_str_id = f"{vendor_item_obj['m_iItemType']:02d}{SEP}{vendor_item_obj['m_iitemID']:04d}"
+        item_id = item_key(vendor_item_obj["m_iItemType"], vendor_item_obj["m_iitemID"])
 
-        if item_str_id not in sources["item_info"]:
+        if item_id not in sources["item_info"]:
             continue
 
-        item_info_obj = sources["item_info"][item_str_id]
+        item_info_obj = sources["item_info"][item_id]
 
         vendor_item_map[npc_type_id].append({
             "ItemInfo": item_info_obj,
@@ -840,18 +1363,18 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
         if npc_type_id not in sources["npc_type_info"]:
             continue
 
-        sources["npc_info"][npc_type_id][str(npc_id)] = {
-            "ID": str(npc_id),
-            "TypeID": npc_type_id,
-            "TypeName": sources["npc_type_info"][npc_type_id]["Name"],
-            "TypeIcon": sources["npc_type_info"][npc_type_id]["Icon"],
-            "X": npc_obj["iX"],
-            "Y": npc_obj["iY"],
-            "Z": npc_obj["iZ"],
-            "Angle": npc_obj["iAngle"],
-            "InstanceID": npc_obj.get("iMapNum", 0),
-            "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], npc_obj["iX"], npc_obj["iY"])),
-        }
+        sources["npc_info"][npc_type_id][str(npc_id)] = NPCInstance(
+            ID=str(npc_id),
+            TypeID=npc_type_id,
+            TypeName=sources["npc_type_info"][npc_type_id]["Name"],
+            TypeIcon=sources["npc_type_info"][npc_type_id]["Icon"],
+            X=npc_obj["iX"],
+            Y=npc_obj["iY"],
+            Z=npc_obj["iZ"],
+            Angle=npc_obj["iAngle"],
+            InstanceID=npc_obj.get("iMapNum", 0),
+            AreaZone=locate_area_tag(sources["area_info"], npc_obj["iX"], npc_obj["iY"]),
+        )
         sources["npc_mob_info"][npc_type_id][str(npc_id)] = sources["npc_info"][npc_type_id][str(npc_id)]
 
     for mob_category in ["mobs", "groups"]:
@@ -864,20 +1387,21 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
             if mob_type_id not in sources["mob_type_info"]:
                 continue
 
-            sources["mob_info"][mob_type_id][str(mob_id)] = {
-                "ID": str(mob_id),
-                "TypeID": mob_type_id,
-                "TypeName": sources["mob_type_info"][mob_type_id]["Name"],
-                "TypeIcon": sources["mob_type_info"][mob_type_id]["Icon"],
-                "FollowsMobID": "",
-                "HP": mob_obj.get("iHP", sources["mob_type_info"][mob_type_id]["StandardHP"]),
-                "X": mob_obj["iX"],
-                "Y": mob_obj["iY"],
-                "Z": mob_obj["iZ"],
-                "Angle": mob_obj["iAngle"],
-                "InstanceID": mob_obj.get("iMapNum", 0),
-                "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], mob_obj["iX"], mob_obj["iY"])),
-            }
+            area_zone = locate_area_tag(sources["area_info"], mob_obj["iX"], mob_obj["iY"])
+            sources["mob_info"][mob_type_id][str(mob_id)] = MobInstance(
+                ID=str(mob_id),
+                TypeID=mob_type_id,
+                TypeName=sources["mob_type_info"][mob_type_id]["Name"],
+                TypeIcon=sources["mob_type_info"][mob_type_id]["Icon"],
+                FollowsMobID="",
+                HP=mob_obj.get("iHP", sources["mob_type_info"][mob_type_id]["StandardHP"]),
+                X=mob_obj["iX"],
+                Y=mob_obj["iY"],
+                Z=mob_obj["iZ"],
+                Angle=mob_obj["iAngle"],
+                InstanceID=mob_obj.get("iMapNum", 0),
+                AreaZone=area_zone,
+            )
             sources["npc_mob_info"][mob_type_id][str(mob_id)] = sources["mob_info"][mob_type_id][str(mob_id)]
 
             if "aFollowers" not in mob_obj:
@@ -890,20 +1414,20 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
                     continue
 
                 str_follower_id = f"{mob_id}:follower_{i + 1}"
-                sources["mob_info"][follower_mob_type_id][str_follower_id] = {
-                    "ID": str_follower_id,
-                    "TypeID": follower_mob_type_id,
-                    "TypeName": sources["mob_type_info"][follower_mob_type_id]["Name"],
-                    "TypeIcon": sources["mob_type_info"][follower_mob_type_id]["Icon"],
-                    "FollowsMobID": mob_id,
-                    "HP": follower_obj.get("iHP", sources["mob_type_info"][follower_mob_type_id]["StandardHP"]),
-                    "X": mob_obj["iX"] + follower_obj["iOffsetX"],
-                    "Y": mob_obj["iY"] + follower_obj["iOffsetY"],
-                    "Z": mob_obj["iZ"],
-                    "Angle": mob_obj["iAngle"],
-                    "InstanceID": mob_obj.get("iMapNum", 0),
-                    "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], mob_obj["iX"], mob_obj["iY"])),
-                }
+                sources["mob_info"][follower_mob_type_id][str_follower_id] = MobInstance(
+                    ID=str_follower_id,
+                    TypeID=follower_mob_type_id,
+                    TypeName=sources["mob_type_info"][follower_mob_type_id]["Name"],
+                    TypeIcon=sources["mob_type_info"][follower_mob_type_id]["Icon"],
+                    FollowsMobID=mob_id,
+                    HP=follower_obj.get("iHP", sources["mob_type_info"][follower_mob_type_id]["StandardHP"]),
+                    X=mob_obj["iX"] + follower_obj["iOffsetX"],
+                    Y=mob_obj["iY"] + follower_obj["iOffsetY"],
+                    Z=mob_obj["iZ"],
+                    Angle=mob_obj["iAngle"],
+                    InstanceID=mob_obj.get("iMapNum", 0),
+                    AreaZone=area_zone,
+                )
                 sources["npc_mob_info"][follower_mob_type_id][str_follower_id] = sources["mob_info"][follower_mob_type_id][str_follower_id]
 
     # add additional NPCs
@@ -915,18 +1439,18 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
             continue
 
         npc_id = NPC_SPECIAL_ID_OFFSET + i
-        sources["npc_info"][npc_type_id][str(npc_id)] = {
-            "ID": str(npc_id),
-            "TypeID": npc_type_id,
-            "TypeName": sources["npc_type_info"][npc_type_id]["Name"],
-            "TypeIcon": sources["npc_type_info"][npc_type_id]["Icon"],
-            "X": additional_npc_info["x"],
-            "Y": additional_npc_info["y"],
-            "Z": additional_npc_info["z"],
-            "Angle": additional_npc_info["angle"],
-            "InstanceID": additional_npc_info["instance_id"],
-            "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], additional_npc_info["x"], additional_npc_info["y"])),
-        }
+        sources["npc_info"][npc_type_id][str(npc_id)] = NPCInstance(
+            ID=str(npc_id),
+            TypeID=npc_type_id,
+            TypeName=sources["npc_type_info"][npc_type_id]["Name"],
+            TypeIcon=sources["npc_type_info"][npc_type_id]["Icon"],
+            X=additional_npc_info["x"],
+            Y=additional_npc_info["y"],
+            Z=additional_npc_info["z"],
+            Angle=additional_npc_info["angle"],
+            InstanceID=additional_npc_info["instance_id"],
+            AreaZone=locate_area_tag(sources["area_info"], additional_npc_info["x"], additional_npc_info["y"]),
+        )
         sources["npc_mob_info"][npc_type_id][str(npc_id)] = sources["npc_info"][npc_type_id][str(npc_id)]
 
     # add additional mobs
@@ -938,20 +1462,20 @@ def construct_npc_mob_info_data(sources: dict[str, dict]) -> None:
             continue
 
         mob_id = MOB_SPECIAL_ID_OFFSET + i
-        sources["mob_info"][mob_type_id][str(mob_id)] = {
-            "ID": str(mob_id),
-            "TypeID": mob_type_id,
-            "TypeName": sources["mob_type_info"][mob_type_id]["Name"],
-            "TypeIcon": sources["mob_type_info"][mob_type_id]["Icon"],
-            "FollowsMobID": "",
-            "HP": sources["mob_type_info"][mob_type_id]["StandardHP"],
-            "X": additional_mob_info["x"],
-            "Y": additional_mob_info["y"],
-            "Z": additional_mob_info["z"],
-            "Angle": additional_mob_info["angle"],
-            "InstanceID": additional_mob_info["instance_id"],
-            "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], additional_mob_info["x"], additional_mob_info["y"])),
-        }
+        sources["mob_info"][mob_type_id][str(mob_id)] = MobInstance(
+            ID=str(mob_id),
+            TypeID=mob_type_id,
+            TypeName=sources["mob_type_info"][mob_type_id]["Name"],
+            TypeIcon=sources["mob_type_info"][mob_type_id]["Icon"],
+            FollowsMobID="",
+            HP=sources["mob_type_info"][mob_type_id]["StandardHP"],
+            X=additional_mob_info["x"],
+            Y=additional_mob_info["y"],
+            Z=additional_mob_info["z"],
+            Angle=additional_mob_info["angle"],
+            InstanceID=additional_mob_info["instance_id"],
+            AreaZone=locate_area_tag(sources["area_info"], additional_mob_info["x"], additional_mob_info["y"]),
+        )
         sources["npc_mob_info"][mob_type_id][str(mob_id)] = sources["mob_info"][mob_type_id][str(mob_id)]
 
 
@@ -982,7 +1506,7 @@ def construct_egg_data(sources: dict[str, dict]) -> None:
         egg_effect_id = egg_type_obj["EffectId"]
         egg_skill_obj = skill_data_list[egg_effect_id]
         egg_crate_id = egg_type_obj["DropCrateId"]
-        egg_crate_item_str_id = f"09{SEP}{egg_crate_id:04d}"
+        egg_crate_item_id = item_key(9, egg_crate_id)
 
         sources["egg_type_info"][egg_type_id] = {
             "ID": egg_type_id,
@@ -990,8 +1514,8 @@ def construct_egg_data(sources: dict[str, dict]) -> None:
             "Comment": egg_type_string_obj["m_strComment"],
             "ExtraComment": egg_type_string_obj["m_strComment1"],
             "CrateID": egg_crate_id,
-            "CrateItemID": egg_crate_item_str_id,
-            "Crate": sources["item_info"].get(egg_crate_item_str_id),
+            "CrateItemID": item_key_str(egg_crate_item_id),
+            "Crate": sources["item_info"].get(egg_crate_item_id),
             "EffectID": egg_effect_id,
             "Effect": skill_string_list[egg_effect_id]["m_strName"],
             "EffectIcon": f"icons/skillicon_{skill_icon_list[egg_skill_obj['m_iIcon']]['m_iIconNumber']:02d}.png",
@@ -1007,18 +1531,18 @@ def construct_egg_data(sources: dict[str, dict]) -> None:
         if egg_type_id not in sources["egg_type_info"]:
             continue
 
-        sources["egg_info"][egg_type_id][str(egg_id)] = {
-            "ID": str(egg_id),
-            "TypeID": egg_type_id,
-            "TypeName": sources["egg_type_info"][egg_type_id]["Name"],
-            "TypeComment": sources["egg_type_info"][egg_type_id]["Comment"],
-            "TypeExtraComment": sources["egg_type_info"][egg_type_id]["ExtraComment"],
-            "X": egg_obj["iX"],
-            "Y": egg_obj["iY"],
-            "Z": egg_obj["iZ"],
-            "InstanceID": egg_obj.get("iMapNum", 0),
-            "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], egg_obj["iX"], egg_obj["iY"])),
-        }
+        sources["egg_info"][egg_type_id][str(egg_id)] = EggInstance(
+            ID=str(egg_id),
+            TypeID=egg_type_id,
+            TypeName=sources["egg_type_info"][egg_type_id]["Name"],
+            TypeComment=sources["egg_type_info"][egg_type_id]["Comment"],
+            TypeExtraComment=sources["egg_type_info"][egg_type_id]["ExtraComment"],
+            X=egg_obj["iX"],
+            Y=egg_obj["iY"],
+            Z=egg_obj["iZ"],
+            InstanceID=egg_obj.get("iMapNum", 0),
+            AreaZone=locate_area_tag(sources["area_info"], egg_obj["iX"], egg_obj["iY"]),
+        )
 
     # add additional eggs
     for i, (egg_type_id, additional_egg_info) in enumerate(sources["extra_eggs"].items()):
@@ -1029,18 +1553,18 @@ def construct_egg_data(sources: dict[str, dict]) -> None:
             continue
 
         egg_id = EGG_SPECIAL_ID_OFFSET + i
-        sources["egg_info"][egg_type_id][str(egg_id)] = {
-            "ID": str(egg_id),
-            "TypeID": egg_type_id,
-            "TypeName": sources["egg_type_info"][egg_type_id]["Name"],
-            "TypeComment": sources["egg_type_info"][egg_type_id]["Comment"],
-            "TypeExtraComment": sources["egg_type_info"][egg_type_id]["ExtraComment"],
-            "X": additional_egg_info["x"],
-            "Y": additional_egg_info["y"],
-            "Z": additional_egg_info["z"],
-            "InstanceID": additional_egg_info["instance_id"],
-            "AreaZone": to_area_tag(locate_coordinates(sources["area_info"], additional_egg_info["x"], additional_egg_info["y"])),
-        }
+        sources["egg_info"][egg_type_id][str(egg_id)] = EggInstance(
+            ID=str(egg_id),
+            TypeID=egg_type_id,
+            TypeName=sources["egg_type_info"][egg_type_id]["Name"],
+            TypeComment=sources["egg_type_info"][egg_type_id]["Comment"],
+            TypeExtraComment=sources["egg_type_info"][egg_type_id]["ExtraComment"],
+            X=additional_egg_info["x"],
+            Y=additional_egg_info["y"],
+            Z=additional_egg_info["z"],
+            InstanceID=additional_egg_info["instance_id"],
+            AreaZone=locate_area_tag(sources["area_info"], additional_egg_info["x"], additional_egg_info["y"]),
+        )
 
 
 def construct_mission_data(sources: dict[str, dict]) -> None:
@@ -1195,7 +1719,7 @@ def construct_mission_data(sources: dict[str, dict]) -> None:
                 mission_info_obj["Rewards"]["Taros"] = task_reward_obj["m_iCash"]
                 mission_info_obj["Rewards"]["FM"] = task_reward_obj["m_iFusionMatter"]
                 mission_info_obj["Rewards"]["Items"] = [
-                    sources["item_info"][f"{item_type:02d}{SEP}{item_id:04d}"]
+                    sources["item_info"][item_key(item_type, item_id)]
                     for item_type, item_id in zip(
                         task_reward_obj["m_iMissionRewarItemType"],
                         task_reward_obj["m_iMissionRewardItemID"],
@@ -1382,7 +1906,7 @@ def construct_instance_data(sources: dict[str, dict]) -> None:
         warp_task_obj = mission_task_dict[warp_task_id] if warp_task_id in mission_task_dict else mission_task_dict[0]
         use_item_type = warp_data_obj["m_iLimit_UseItemType"]
         use_item_id = warp_data_obj["m_iLimit_UseItemID"]
-        item_str_id = f"{use_item_type:02d}{SEP}{use_item_id:04d}"
+        use_item_key = item_key(use_item_type, use_item_id)
 
         if warp_npc_id not in sources["npc_type_info"]:
             continue
@@ -1418,7 +1942,7 @@ def construct_instance_data(sources: dict[str, dict]) -> None:
             "RequiredMinLevel": warp_data_obj["m_iLimit_Level"],
             "RequiredItemType": use_item_type,
             "RequiredItemID": use_item_id,
-            "RequiredItem": sources["item_info"].get(item_str_id),
+            "RequiredItem": sources["item_info"].get(use_item_key),
         }
 
     for instance_data_obj in instance_data_list[1:]:
@@ -1468,7 +1992,7 @@ def construct_nano_data(sources: dict) -> None:
         nano_tune_name = nano_tune_string_list[nano_tune_obj["m_iTuneName"]]["m_strName"]
         nano_tune_type_name = nano_tune_string_list[nano_tune_obj["m_iTuneName"]]["m_strComment1"]
         nano_tune_comment = nano_tune_string_list[nano_tune_obj["m_iComment"]]["m_strComment"]
-        item_str_id = f"07{SEP}{nano_tune_obj['m_iReqItemID']:04d}"
+        power_item_id = item_key(7, nano_tune_obj["m_iReqItemID"])
         skill_id = nano_tune_obj["m_iSkillID"]
         skill_obj = skill_data_list[skill_id]
 
@@ -1479,7 +2003,7 @@ def construct_nano_data(sources: dict) -> None:
             "Comment": nano_tune_comment,
             "Icon": f"icons/skillicon_{nano_tune_icon_list[skill_obj['m_iIcon']]['m_iIconNumber']:02d}.png",
             "PowerItemID": nano_tune_obj["m_iReqItemID"],
-            "PowerItem": sources["item_info"][item_str_id],
+            "PowerItem": sources["item_info"][power_item_id],
             "PowerItemCount": nano_tune_obj["m_iReqItemCount"],
             "SkillID": skill_id,
             "SkillName": skill_string_list[skill_id]["m_strName"],
@@ -1541,14 +2065,14 @@ def construct_vendor_data(sources: dict) -> None:
         for vendor_item_obj in vendor_item_data_group:
             item_id = vendor_item_obj["m_iitemID"]
             item_type_id = vendor_item_obj["m_iItemType"]
-            item_str_id = f"{item_type_id:02d}{SEP}{item_id:04d}"
+            key = item_key(item_type_id, item_id)
 
-            if item_str_id not in sources["item_info"]:
+            if key not in sources["item_info"]:
                 continue
 
-            item_info_obj = sources["item_info"][item_str_id]
+            item_info_obj = sources["item_info"][key]
 
-            sources["vendor_info"][vendor_id]["Items"][item_str_id] = {
+            sources["vendor_info"][vendor_id]["Items"][key] = {
                 "ItemTypeID": item_type_id,
                 "ItemType": ITEM_TYPES[item_type_id],
                 "ItemID": item_id,
@@ -1593,7 +2117,7 @@ def construct_ep_instance_data(sources: dict) -> None:
                 5 - i: {
                     "ItemTypeID": 9,
                     "ItemID": item_id,
-                    "Item": sources["item_info"][f"09{SEP}{item_id:04d}"],
+                    "Item": sources["item_info"][item_key(9, item_id)],
                     "RankScore": rank_score,
                 }
                 for i, (rank_score, item_id) in enumerate(zip(racing_obj["RankScores"], racing_obj["Rewards"]))
@@ -1620,12 +2144,12 @@ def construct_code_item_data(sources: dict) -> None:
             item_reference_obj = item_references[item_reference_id]
             item_id = item_reference_obj["ItemID"]
             item_type_id = item_reference_obj["Type"]
-            item_str_id = f"{item_type_id:02d}{SEP}{item_id:04d}"
+            key = item_key(item_type_id, item_id)
 
-            if item_str_id not in sources["item_info"]:
+            if key not in sources["item_info"]:
                 continue
 
-            sources["code_item_info"][code]["Items"][item_str_id] = sources["item_info"][item_str_id]
+            sources["code_item_info"][code]["Items"][key] = sources["item_info"][key]
 
 
 def construct_transportation_data(sources: dict) -> None:
@@ -1836,7 +2360,7 @@ def construct_combination_data(sources: dict) -> None:
 
 
 def construct_egg_instance_region_grouped_data(sources: dict) -> None:
-    sources["egg_instance_region_grouped_info"] = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    sources["egg_instance_region_grouped_info"] = defaultdict(partial(defaultdict, partial(defaultdict, list)))
 
     for egg_obj_dict in sources["egg_info"].values():
         for egg_obj in egg_obj_dict.values():
@@ -1847,7 +2371,7 @@ def construct_egg_instance_region_grouped_data(sources: dict) -> None:
 
 
 def construct_npc_instance_region_grouped_data(sources: dict) -> None:
-    sources["npc_instance_region_grouped_info"] = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    sources["npc_instance_region_grouped_info"] = defaultdict(partial(defaultdict, partial(defaultdict, list)))
 
     for npc_obj_dict in sources["npc_info"].values():
         for npc_obj in npc_obj_dict.values():
@@ -1858,7 +2382,7 @@ def construct_npc_instance_region_grouped_data(sources: dict) -> None:
 
 
 def construct_mob_instance_region_grouped_data(sources: dict) -> None:
-    sources["mob_instance_region_grouped_info"] = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    sources["mob_instance_region_grouped_info"] = defaultdict(partial(defaultdict, partial(defaultdict, list)))
 
     for mob_obj_dict in sources["mob_info"].values():
         for mob_obj in mob_obj_dict.values():
@@ -1872,8 +2396,8 @@ def construct_code_item_source_data(sources: dict) -> None:
     sources["code_item_source_info"] = defaultdict(list)
 
     for code_item_obj in sources["code_item_info"].values():
-        for item_str_id in code_item_obj["Items"]:
-            sources["code_item_source_info"][item_str_id].append({"Code": code_item_obj["Code"]})
+        for key in code_item_obj["Items"]:
+            sources["code_item_source_info"][key].append({"Code": code_item_obj["Code"]})
 
 
 def construct_vendor_source_data(sources: dict) -> None:
@@ -1890,8 +2414,8 @@ def construct_vendor_source_data(sources: dict) -> None:
         for instance_id, area_dict in sources["npc_instance_region_grouped_info"].get(vendor_id, {}).items():
             for area_tag, npc_list in area_dict.items():
                 for npc_obj in npc_list:
-                    for item_str_id, vendor_item_obj in vendor_obj["Items"].items():
-                        sources["vendor_source_info"][item_str_id].append({
+                    for key, vendor_item_obj in vendor_obj["Items"].items():
+                        sources["vendor_source_info"][key].append({
                             "NPCID": npc_obj["ID"],
                             "NPCTypeID": vendor_id,
                             "NPCName": vendor_npc_type["Name"],
@@ -2068,7 +2592,7 @@ def construct_mission_reward_source_data(sources: dict) -> None:
             for area_tag, npc_list in area_dict.items():
                 for npc_obj in npc_list:
                     for reward_item in mission_obj["Rewards"]["Items"]:
-                        sources["mission_reward_source_info"][reward_item["ID"]].append({
+                        sources["mission_reward_source_info"][item_key(reward_item["TypeID"], reward_item["ItemID"])].append({
                             "NPCID": npc_obj["ID"],
                             "NPCTypeID": mission_start_npc_id,
                             "NPCName": mission_start_npc_type["Name"],
@@ -2115,8 +2639,8 @@ def construct_crate_item_source_data(sources: dict) -> None:
     sources["item_to_crate_info"] = defaultdict(list)
     sources["crate_to_item_info"] = defaultdict(list)
 
-    item_ref_to_str_id = {
-        ir_id: "{Type:02d}{sep}{ItemID:04d}".format(**ir, sep=SEP)
+    item_ref_to_key = {
+        ir_id: item_key(ir["Type"], ir["ItemID"])
         for ir_id, ir in sources["drops_map"]["ItemReferences"].items()
     }
 
@@ -2125,16 +2649,16 @@ def construct_crate_item_source_data(sources: dict) -> None:
             ir_id
             for ir_id in item_reference_ids
             # itemref may be removed but still referenced in itemset, or not present in build
-            if ir_id in item_ref_to_str_id and item_ref_to_str_id[ir_id] in sources["item_info"]
+            if ir_id in item_ref_to_key and item_ref_to_key[ir_id] in sources["item_info"]
         ]
 
     real_gender_map = {
-        ir_id: sources["item_info"].get(item_str_id, {}).get("GenderID", 0)
-        for ir_id, item_str_id in item_ref_to_str_id.items()
+        ir_id: sources["item_info"].get(key, {}).get("GenderID", 0)
+        for ir_id, key in item_ref_to_key.items()
     }
     real_rarity_map = {
-        ir_id: sources["item_info"].get(item_str_id, {}).get("RarityID", 0)
-        for ir_id, item_str_id in item_ref_to_str_id.items()
+        ir_id: sources["item_info"].get(key, {}).get("RarityID", 0)
+        for ir_id, key in item_ref_to_key.items()
     }
     itemset_views = {
         is_id: {
@@ -2162,8 +2686,7 @@ def construct_crate_item_source_data(sources: dict) -> None:
         rarity_weights_obj = sources["drops_map"]["RarityWeights"][crate_obj["RarityWeightID"]]
         item_reference_ids = sanitize_item_reference_ids(itemset_obj["ItemReferenceIDs"])
 
-        crate_str_id = f"09{SEP}{crate_id:04d}"
-        crate_obj = sources["item_info"][crate_str_id]
+        crate_obj = sources["item_info"][item_key(9, crate_id)]
 
         itemset_view = itemset_views[itemset_obj["ItemSetID"]]
         boy_rarity_weights = itemset_view[GENDERS.index("Male")]
@@ -2192,14 +2715,14 @@ def construct_crate_item_source_data(sources: dict) -> None:
                 girl_probabilities[ir_id] += rarity_probability * Fraction(girl_rarity_ir_weights[ir_id], sum_girl_rarity_ir_weights)
 
         for ir_id in item_reference_ids:
-            item_str_id = item_ref_to_str_id[ir_id]
-            item_obj = sources["item_info"][item_str_id]
+            key = item_ref_to_key[ir_id]
+            item_obj = sources["item_info"][key]
             boy_odds = str(boy_probabilities[ir_id])
             girl_odds = str(girl_probabilities[ir_id])
             boy_probability = float(boy_probabilities[ir_id])
             girl_probability = float(girl_probabilities[ir_id])
 
-            sources["item_to_crate_info"][item_str_id].append({
+            sources["item_to_crate_info"][key].append({
                 "ContainingCrate": crate_obj,
                 "BoyOdds": boy_odds,
                 "GirlOdds": girl_odds,
@@ -2219,21 +2742,21 @@ def construct_crate_item_source_data(sources: dict) -> None:
 def construct_crate_source_data(sources: dict) -> None:
     sources["crate_source_info"] = defaultdict(list)
 
-    for item_str_id, item_obj in sources["item_info"].items():
+    for key, item_obj in sources["item_info"].items():
         if item_obj["TypeID"] != 9:
             continue
 
         crate_id = item_obj["ItemID"]
 
         # code item source
-        for code_item_obj in sources["code_item_source_info"].get(item_str_id, []):
+        for code_item_obj in sources["code_item_source_info"].get(key, []):
             sources["crate_source_info"][crate_id].append({
                 "SourceType": "CodeItem",
                 "Source": code_item_obj,
             })
 
         # vendor npc crate source
-        for vendor_obj in sources["vendor_source_info"].get(item_str_id, []):
+        for vendor_obj in sources["vendor_source_info"].get(key, []):
             sources["crate_source_info"][crate_id].append({
                 "SourceType": "Vendor",
                 "Source": vendor_obj,
@@ -2279,7 +2802,7 @@ def construct_crate_source_data(sources: dict) -> None:
             })
 
         # mission reward crate source
-        for mission_reward_obj in sources["mission_reward_source_info"].get(item_str_id, []):
+        for mission_reward_obj in sources["mission_reward_source_info"].get(key, []):
             sources["crate_source_info"][crate_id].append({
                 "SourceType": "MissionReward",
                 "Source": mission_reward_obj,
@@ -2289,49 +2812,44 @@ def construct_crate_source_data(sources: dict) -> None:
 def construct_item_source_data(sources: dict) -> None:
     sources["item_source_info"] = defaultdict(list)
 
-    for item_str_id, item_obj in sources["item_info"].items():
-        item_name = item_obj["Name"]
-        item_tag = f"{item_str_id}{SEP}{item_name}"
-
+    for key in sources["item_info"]:
         # code item source
-        for code_item_obj in sources["code_item_source_info"].get(item_str_id, []):
-            sources["item_source_info"][item_tag].append({
+        for code_item_obj in sources["code_item_source_info"].get(key, []):
+            sources["item_source_info"][key].append({
                 "SourceType": "CodeItem",
                 "Source": code_item_obj,
             })
 
         # vendor npc crate source
-        for vendor_obj in sources["vendor_source_info"].get(item_str_id, []):
-            sources["item_source_info"][item_tag].append({
+        for vendor_obj in sources["vendor_source_info"].get(key, []):
+            sources["item_source_info"][key].append({
                 "SourceType": "Vendor",
                 "Source": vendor_obj,
                 "SourcePrice": vendor_obj["Price"],
             })
 
         # mission reward crate source
-        for mission_reward_obj in sources["mission_reward_source_info"].get(item_str_id, []):
-            sources["item_source_info"][item_tag].append({
+        for mission_reward_obj in sources["mission_reward_source_info"].get(key, []):
+            sources["item_source_info"][key].append({
                 "SourceType": "MissionReward",
                 "Source": mission_reward_obj,
             })
 
         # crate content source
-        def source_recurse(str_id: str) -> list[dict]:
-            crate_content_objs = sources["item_to_crate_info"].get(str_id, [])
+        def source_recurse(key: int) -> list[dict]:
+            crate_content_objs = sources["item_to_crate_info"].get(key, [])
 
             if not crate_content_objs:
-                type_id, item_id = map(int, str_id.split(SEP))
-                return sources["crate_source_info"].get(item_id, []) if type_id == 9 else []
+                return sources["crate_source_info"].get(key & 0xFFFF, []) if key >> 16 == 9 else []
 
             crate_sources = []
 
             for crate_content_obj in crate_content_objs:
-                containing_crate_id = crate_content_obj["ContainingCrate"]["ItemID"]
-                containing_crate_str_id = f"09{SEP}{containing_crate_id:04d}"
+                containing_crate_key = item_key(9, crate_content_obj["ContainingCrate"]["ItemID"])
                 boy_probability = Fraction(crate_content_obj["BoyOdds"])
                 girl_probability = Fraction(crate_content_obj["GirlOdds"])
 
-                for crate_source_obj in source_recurse(containing_crate_str_id):
+                for crate_source_obj in source_recurse(containing_crate_key):
                     source_type = crate_source_obj["SourceType"]
 
                     source_result = {
@@ -2369,7 +2887,7 @@ def construct_item_source_data(sources: dict) -> None:
                 source_obj["Source"]["LocationLimits"]["MaxZ"],
             )
 
-        if (recursed_sources := source_recurse(item_str_id)):
+        if (recursed_sources := source_recurse(key)):
             mob_id_location_groupped_sources = {
                 mob_id_location: list(source_iter)
                 for mob_id_location, source_iter in groupby(
@@ -2380,7 +2898,7 @@ def construct_item_source_data(sources: dict) -> None:
 
             for mob_id_location, source_list in mob_id_location_groupped_sources.items():
                 if mob_id_location[0] == 0 or len(source_list) < 2:
-                    sources["item_source_info"][item_tag].extend(source_list)
+                    sources["item_source_info"][key].extend(source_list)
                     continue
 
                 merged_source = {
@@ -2392,15 +2910,14 @@ def construct_item_source_data(sources: dict) -> None:
                     "SourceGirlProbability": sum(source_obj["SourceGirlProbability"] for source_obj in source_list),
                 }
 
-                sources["item_source_info"][item_tag].append(merged_source)
+                sources["item_source_info"][key].append(merged_source)
 
 
 def construct_source_item_data(sources: dict) -> None:
-    sources["source_item_info"] = defaultdict(lambda: defaultdict(dict))
+    sources["source_item_info"] = defaultdict(partial(defaultdict, dict))
 
-    for item_tag, source_obj_list in sources["item_source_info"].items():
-        last_sep_idx = item_tag.rfind(SEP)
-        item_obj = sources["item_info"][item_tag[:last_sep_idx]]
+    for key, source_obj_list in sources["item_source_info"].items():
+        item_obj = sources["item_info"][key]
 
         for source_obj in source_obj_list:
             source_type_id = source_obj["SourceType"]
@@ -2419,7 +2936,7 @@ def construct_source_item_data(sources: dict) -> None:
             )
             source_tag = f"{source_id}{SEP + source_name if source_name else ''}{SEP + source_extra_id if source_extra_id else ''}"
 
-            sources["source_item_info"][source_type_id][source_tag][item_tag] = {
+            sources["source_item_info"][source_type_id][source_tag][key] = {
                 "Item": item_obj,
                 **{k: v for k, v in source_obj.items() if k not in ["SourceType", "Source"]},
             }
@@ -2646,14 +3163,11 @@ def construct_valid_id_sets(sources: dict) -> None:
         return False
 
     sources["valid_items"] = {
-        obj["ID"]
-        for obj in sources["item_info"].values()
+        key
+        for key in sources["item_info"]
         if any(
             source_valid(source_obj)
-            for source_obj in sources["item_source_info"].get(
-                "{ID}{SEP}{Name}".format(**obj, SEP=SEP),
-                [],
-            )
+            for source_obj in sources["item_source_info"].get(key, [])
         )
     }
 
@@ -2676,34 +3190,35 @@ def mark_valid_sources(sources: dict) -> None:
     mark_single(sources, "item_info", "valid_items", mark_key="Obtainable")
 
 
-def export_json_source_info(out_info_dir: Path, sources: dict) -> None:
-    source_keys = [
-        "player_info",
-        "item_info",
-        "npc_type_info",
-        "mob_type_info",
-        "npc_info",
-        "mob_info",
-        "egg_type_info",
-        "egg_info",
-        "mission_info",
-        "instance_info",
-        "nano_info",
-        "area_info",
-        "vendor_info",
-        "infected_zone_info",
-        "code_item_info",
-        "transportation_info",
-        "combination_info",
-        "item_source_info",
-        "source_item_info",
-        "crate_to_item_info",
-        "item_to_crate_info",
-    ]
+def stringify_item_keys(sources: dict) -> None:
+    def stringify_in_place(dct: dict, key_func=item_key_str) -> None:
+        # some of these dicts are shared by other objects, so keep their identity
+        items = list(dct.items())
+        dct.clear()
+        dct.update((key_func(key), value) for key, value in items)
+
+    def to_item_tag(key: int) -> str:
+        return "{ID}{SEP}{Name}".format(**sources["item_info"][key], SEP=SEP)
+
+    for vendor_obj in sources["vendor_info"].values():
+        stringify_in_place(vendor_obj["Items"])
+
+    for code_item_obj in sources["code_item_info"].values():
+        stringify_in_place(code_item_obj["Items"])
+
+    for source_type_dict in sources["source_item_info"].values():
+        for item_dict in source_type_dict.values():
+            stringify_in_place(item_dict, to_item_tag)
+
+    stringify_in_place(sources["item_source_info"], to_item_tag)
+    stringify_in_place(sources["item_to_crate_info"])
+    stringify_in_place(sources["item_info"])
 
-    for key in source_keys:
+
+def export_json_source_info(out_info_dir: Path, sources: dict) -> None:
+    for key in JSON_EXPORT_KEYS:
         with open(out_info_dir / f"{key}.json", "w") as f:
-            json.dump(sources[key], f, indent=4, sort_keys=True)
+            json.dump(sources[key], f, indent=4, sort_keys=True, default=dict)
 
 
 def export_csv_source_info(out_info_dir: Path, sources: dict) -> None:
@@ -3198,7 +3713,131 @@ def export_csv_source_info(out_info_dir: Path, sources: dict) -> None:
             })
 
 
+def write_sqlite_table(
+    connection: sqlite3.Connection,
+    table: str,
+    rows: list[Mapping],
+    primary_key: Optional[str],
+    indexes: list[tuple[str, ...]],
+) -> None:
+    # scalar fields become columns, nested ones are left to the tables that normalize them
+    columns = {}
+
+    for row in rows:
+        for field, value in row.items():
+            if field not in columns and type(value) in SQLITE_TYPES:
+                columns[field] = SQLITE_TYPES[type(value)]
+
+    # tables without rows in this build still get the columns they are looked up by
+    for field in [primary_key, *(field for index in indexes for field in index)]:
+        if field:
+            columns.setdefault(field, "")
+
+    fields = list(columns)
+    column_defs = ", ".join(
+        f'"{field}" {columns[field]}{" PRIMARY KEY" if field == primary_key else ""}'.rstrip() for field in fields
+    )
+    connection.execute(f'CREATE TABLE "{table}" ({column_defs})')
+    connection.executemany(
+        f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(fields))})',
+        ([row.get(field) if type(row.get(field)) in SQLITE_TYPES else None for field in fields] for row in rows),
+    )
+
+    for index in indexes:
+        index_columns = ", ".join(f'"{field}"' for field in index)
+        connection.execute(f'CREATE INDEX "{table}_{"_".join(index)}" ON "{table}" ({index_columns})')
+
+
+def export_sqlite_source_info(out_info_dir: Path, sources: dict) -> None:
+    def get_item_id(item_tag: str) -> str:
+        # item tags are "TT::IIII::Name", and names may contain the separator too
+        return SEP.join(item_tag.split(SEP, 2)[:2])
+
+    def get_instance_rows(key: str) -> list[dict]:
+        return [dict(obj) for obj_dict in sources[key].values() for obj in obj_dict.values()]
+
+    item_source_rows = []
+    for item_tag, source_obj_list in sources["item_source_info"].items():
+        for source_obj in source_obj_list:
+            source_type = source_obj["SourceType"]
+            source_info = source_obj["Source"]
+
+            item_source_rows.append({
+                "ItemID": get_item_id(item_tag),
+                "SourceType": source_type,
+                "SourceID": source_info[SOURCE_TYPE_ID_FIELD_MAP[source_type]],
+                "SourceName": source_info[SOURCE_TYPE_NAME_FIELD_MAP[source_type]] if source_type in SOURCE_TYPE_NAME_FIELD_MAP else "",
+                **{k: v for k, v in source_obj.items() if k not in ["SourceType", "Source"]},
+            })
+
+    crate_item_rows = [
+        {
+            "CrateID": item_key_str(item_key(9, crate_id)),
+            "ItemID": crate_item_obj["Item"]["ID"],
+            **{k: v for k, v in crate_item_obj.items() if k != "Item"},
+        }
+        for crate_id, crate_item_obj_list in sources["crate_to_item_info"].items()
+        for crate_item_obj in crate_item_obj_list
+    ]
+
+    mission_task_rows = [
+        {**task_obj, "MissionID": mission_obj["ID"]}
+        for mission_obj in sources["mission_info"].values()
+        for task_obj in mission_obj["Tasks"].values()
+    ]
+    mission_reward_item_rows = [
+        {"MissionID": mission_obj["ID"], "ItemID": item_obj["ID"]}
+        for mission_obj in sources["mission_info"].values()
+        for item_obj in mission_obj["Rewards"]["Items"]
+    ]
+    mission_requirement_rows = [
+        {"MissionID": mission_obj["ID"], "RequiredMissionID": required_mission_id}
+        for mission_obj in sources["mission_info"].values()
+        for required_mission_id in mission_obj["RequiredMissionIDs"]
+        if required_mission_id > 0
+    ]
+
+    area_rows = [
+        {**area_obj, "AreaZone": area_zone}
+        for area_zone, area_obj_list in sources["area_info"].items()
+        for area_obj in area_obj_list
+    ]
+
+    db_path = out_info_dir / "info.sqlite"
+    db_path.unlink(missing_ok=True)
+    connection = sqlite3.connect(db_path)
+
+    try:
+        # built from scratch in one go, a crash only leaves a file that is written again next time
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+
+        with connection:
+            write_sqlite_table(connection, "items", list(sources["item_info"].values()), "ID", [("TypeID", "ItemID"), ("Name",)])
+            write_sqlite_table(connection, "npc_types", list(sources["npc_type_info"].values()), "ID", [("Name",)])
+            write_sqlite_table(connection, "mob_types", list(sources["mob_type_info"].values()), "ID", [("Name",)])
+            write_sqlite_table(connection, "egg_types", list(sources["egg_type_info"].values()), "ID", [("CrateItemID",)])
+            write_sqlite_table(connection, "npcs", get_instance_rows("npc_info"), None, [("TypeID",), ("AreaZone",), ("InstanceID",)])
+            write_sqlite_table(connection, "mobs", get_instance_rows("mob_info"), None, [("TypeID",), ("AreaZone",), ("InstanceID",)])
+            write_sqlite_table(connection, "eggs", get_instance_rows("egg_info"), None, [("TypeID",), ("AreaZone",), ("InstanceID",)])
+            write_sqlite_table(connection, "areas", area_rows, None, [("AreaZone",)])
+            write_sqlite_table(connection, "instances", list(sources["instance_info"].values()), "ID", [("AreaZone",)])
+            write_sqlite_table(connection, "missions", list(sources["mission_info"].values()), "ID", [("Name",)])
+            write_sqlite_table(connection, "mission_tasks", mission_task_rows, None, [("MissionID",), ("ID",)])
+            write_sqlite_table(connection, "mission_reward_items", mission_reward_item_rows, None, [("MissionID",), ("ItemID",)])
+            write_sqlite_table(connection, "mission_requirements", mission_requirement_rows, None, [("MissionID",), ("RequiredMissionID",)])
+            write_sqlite_table(connection, "crate_items", crate_item_rows, None, [("CrateID",), ("ItemID",)])
+            write_sqlite_table(connection, "item_sources", item_source_rows, None, [("ItemID",), ("SourceType", "SourceID")])
+
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+
 def export_graph_source_info(out_info_dir: Path, sources: dict) -> None:
+    # imported here, so that using the derivation as a library does not load matplotlib
+    import matplotlib.pyplot as plt
+
     random.seed(2009)
     # mission dependency graph
     G = nx.DiGraph()
@@ -3240,6 +3879,399 @@ def export_graph_source_info(out_info_dir: Path, sources: dict) -> None:
     warnings.resetwarnings()
 
 
+def get_stage_name(stage: Callable) -> str:
+    return getattr(stage, "func", stage).__name__
+
+
+def get_rss() -> tuple[int, int]:
+    # the resident set size of this process and its peak in bytes, as the kernel counts them (linux only)
+    with open("/proc/self/status", "r") as f:
+        status = dict(line.split(":", 1) for line in f if ":" in line)
+
+    return int(status["VmRSS"].split()[0]) * 1024, int(status["VmHWM"].split()[0]) * 1024
+
+
+def reset_peak_rss() -> None:
+    # the peak starts again from the current size, so that it only covers what comes after
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def get_last_stage_uses(stages: list[Callable]) -> dict[str, int]:
+    last_uses = {}
+
+    for i, stage in enumerate(stages):
+        for key in STAGE_READS[get_stage_name(stage)]:
+            last_uses[key] = i
+
+    return last_uses
+
+
+def get_event_stage_indices(stage_names: list[str], event_keys: set[str]) -> tuple[set[int], set[str]]:
+    # a stage runs once per event variant if it reads something that differs between them, or if running it before the
+    # variant stages would change what they read or write; stages outside STAGE_WRITES update what they read in place
+    event_stage_indices = set()
+    event_reads = set()
+    event_writes = set(event_keys)
+
+    for i, name in enumerate(stage_names):
+        reads = set(STAGE_READS[name])
+        writes = set(STAGE_WRITES.get(name, reads))
+
+        # the exports write to the folder of each variant
+        if name.startswith("export_") or reads & event_writes or writes & (event_reads | event_writes):
+            event_stage_indices.add(i)
+            event_reads |= reads
+            event_writes |= writes
+
+    return event_stage_indices, event_writes
+
+
+def get_snapshot_keys(sources: dict, event_writes: set[str]) -> list[str]:
+    # the keys the variants write, and every key sharing an object with them, so that their copy shares nothing with the rest
+    keys = [key for key in sources if key != "xdt"] + [f"xdt.{table}" for table in sources.get("xdt", {})]
+    snapshot_keys = [key for key in keys if key in event_writes]
+    other_keys = [key for key in keys if key not in event_writes]
+    snapshot_ids = index_source_objects(sources, snapshot_keys, with_paths=False)[1]
+    found = True
+
+    while found:
+        found = False
+
+        for key in list(other_keys):
+            key_ids = index_source_objects(sources, [key], with_paths=False)[1]
+
+            if not key_ids.isdisjoint(snapshot_ids):
+                snapshot_keys.append(key)
+                other_keys.remove(key)
+                snapshot_ids |= key_ids
+                found = True
+
+    return snapshot_keys
+
+
+def free_dead_sources(sources: dict, last_uses: dict[str, int], stage_index: int) -> None:
+    # xdt tables are freed one by one, the other keys as a whole
+    for table in list(sources.get("xdt", {})):
+        if last_uses.get(f"xdt.{table}", -1) <= stage_index:
+            del sources["xdt"][table]
+
+    for key in list(sources):
+        if key == "xdt" and sources[key]:
+            continue
+
+        if last_uses.get(key, -1) <= stage_index:
+            del sources[key]
+
+
+def save_checkpoint(checkpoint_dir: Path, stage_names: list[str], stage_index: int, sources: dict) -> None:
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    # write then rename, so that a failing run never leaves a truncated checkpoint behind
+    checkpoint_path = checkpoint_dir / f"{stage_index:02d}-{stage_names[stage_index]}.pkl"
+    temp_path = checkpoint_path.with_suffix(".tmp")
+
+    with open(temp_path, "wb") as f:
+        pickle.dump({"stages": stage_names[:stage_index + 1], "sources": sources}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    temp_path.replace(checkpoint_path)
+
+
+def load_checkpoint(checkpoint_dir: Path, stage_names: list[str], resume_index: int) -> tuple[int, dict]:
+    # resume from the latest checkpoint taken before the stage, rerunning the stages in between
+    for stage_index in reversed(range(resume_index)):
+        checkpoint_path = checkpoint_dir / f"{stage_index:02d}-{stage_names[stage_index]}.pkl"
+
+        if not checkpoint_path.is_file():
+            continue
+
+        with open(checkpoint_path, "rb") as f:
+            checkpoint = pickle.load(f)
+
+        if checkpoint["stages"] != stage_names[:stage_index + 1]:
+            raise ValueError(f"Checkpoint {checkpoint_path} was taken with different stages.")
+
+        return stage_index + 1, checkpoint["sources"]
+
+    raise ValueError(f"No checkpoint before stage {stage_names[resume_index]} in {checkpoint_dir}.")
+
+
+class UncacheableStageError(Exception):
+    pass
+
+
+class StageOutputPickler(pickle.Pickler):
+    def __init__(self, file, input_paths: dict[int, tuple], shared_ids: set[int]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.input_paths = input_paths
+        self.shared_ids = shared_ids
+
+    def persistent_id(self, obj: Any) -> Optional[tuple]:
+        # objects taken over from the inputs are stored as their path, so that they stay shared once restored
+        path = self.input_paths.get(id(obj))
+
+        if path is None and id(obj) in self.shared_ids:
+            raise UncacheableStageError(f"Output shares an object that has no path in the inputs: {type(obj).__name__}")
+
+        return path
+
+
+class StageOutputUnpickler(pickle.Unpickler):
+    def __init__(self, file, sources: dict):
+        super().__init__(file)
+        self.sources = sources
+
+    def persistent_load(self, path: tuple) -> Any:
+        key, *subpath = path
+        obj = self.sources["xdt"][key[4:]] if key.startswith("xdt.") else self.sources[key]
+
+        for part in subpath:
+            obj = obj[part]
+
+        return obj
+
+
+def get_value_digest(value: Any) -> str:
+    hasher = hashlib.sha256()
+    pickle.dump(value, SimpleNamespace(write=hasher.update), protocol=pickle.HIGHEST_PROTOCOL)
+    return hasher.hexdigest()
+
+
+def get_server_data_digest(server_data_dir: Path, patch_names: list[str]) -> Optional[str]:
+    commit = get_server_data_commit(server_data_dir)
+
+    if not commit:
+        return None
+
+    return hashlib.sha256(repr((commit, tuple(patch_names))).encode()).hexdigest()
+
+
+def get_source_digest(sources: dict, digests: dict[str, Optional[str]], key: str) -> Optional[str]:
+    # keys loaded from the build are hashed by content, derived keys carry the cache key of the stage that wrote them
+    if key not in digests:
+        value = sources["xdt"].get(key[4:]) if key.startswith("xdt.") else sources.get(key)
+        digests[key] = get_value_digest(value)
+
+    return digests[key]
+
+
+def get_stage_cache_key(stage_name: str, sources: dict, digests: dict[str, Optional[str]]) -> Optional[str]:
+    input_digests = [(key, get_source_digest(sources, digests, key)) for key in STAGE_READS[stage_name]]
+
+    # inputs without a digest (uncommitted server data) cannot be cached
+    if any(digest is None for _, digest in input_digests):
+        return None
+
+    return hashlib.sha256(repr((SCRIPT_DIGEST, stage_name, input_digests)).encode()).hexdigest()
+
+
+def index_source_objects(sources: dict, keys: list[str], with_paths: bool) -> tuple[dict[int, tuple], set[int]]:
+    # every object reachable from the keys, with the path of the ones reachable through mapping keys and list indices
+    paths = {}
+    seen = set()
+    stack = []
+
+    for key in keys:
+        value = sources["xdt"].get(key[4:]) if key.startswith("xdt.") else sources.get(key)
+        stack.append((value, (key,) if with_paths else None))
+
+    while stack:
+        obj, path = stack.pop()
+
+        if isinstance(obj, (str, bytes, int, float, Fraction)) or obj is None:
+            continue
+
+        # objects first reached through a set are walked again once a path to them turns up
+        if id(obj) in seen and (path is None or id(obj) in paths):
+            continue
+
+        seen.add(id(obj))
+
+        if path is not None:
+            paths[id(obj)] = path
+
+        if isinstance(obj, Mapping):
+            stack.extend((value, None if path is None else (*path, key)) for key, value in obj.items())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend((value, None if path is None else (*path, index)) for index, value in enumerate(obj))
+        elif isinstance(obj, (set, frozenset)):
+            stack.extend((value, None) for value in obj)
+
+    return paths, seen
+
+
+def restore_stage_output(cache_path: Path, sources: dict) -> bool:
+    if not cache_path.is_file():
+        return False
+
+    with open(cache_path, "rb") as f:
+        sources.update(StageOutputUnpickler(f, sources).load())
+
+    return True
+
+
+def store_stage_output(cache_path: Path, stage_name: str, sources: dict, updated_ids: set[int]) -> bool:
+    written_keys = [key for key in STAGE_WRITES[stage_name] if key in sources]
+    input_keys = [key for key in STAGE_READS[stage_name] if key not in written_keys]
+
+    # keys updated in place are restored as copies, so nothing else may hold on to the objects they had before
+    if updated_ids:
+        other_keys = [key for key in sources if key != "xdt" and key not in written_keys]
+        other_keys.extend(f"xdt.{table}" for table in sources.get("xdt", {}))
+        _, other_ids = index_source_objects(sources, other_keys, with_paths=False)
+
+        if not updated_ids.isdisjoint(other_ids):
+            return False
+
+    input_paths, input_ids = index_source_objects(sources, input_keys, with_paths=True)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_suffix(".tmp")
+
+    try:
+        with open(temp_path, "wb") as f:
+            StageOutputPickler(f, input_paths, input_ids).dump({key: sources[key] for key in written_keys})
+    except UncacheableStageError:
+        temp_path.unlink()
+        return False
+
+    temp_path.replace(cache_path)
+    return True
+
+
+# the stages that only work on the sources, without reading or writing any files
+DERIVE_STAGES = [
+    construct_area_data,
+    construct_player_info_data,
+    construct_item_info_data,
+    construct_npc_mob_info_data,
+    construct_egg_data,
+    construct_mission_data,
+    construct_instance_data,
+    construct_transportation_data,
+    construct_nano_data,
+    construct_vendor_data,
+    construct_ep_instance_data,
+    construct_code_item_data,
+    construct_combination_data,
+    construct_egg_instance_region_grouped_data,
+    construct_npc_instance_region_grouped_data,
+    construct_mob_instance_region_grouped_data,
+    construct_code_item_source_data,
+    construct_vendor_source_data,
+    construct_racing_source_data,
+    construct_mob_event_source_data,
+    construct_mission_reward_source_data,
+    construct_egg_source_data,
+    construct_crate_item_source_data,
+    construct_crate_source_data,
+    construct_item_source_data,
+    construct_source_item_data,
+    fill_area_info,
+    construct_valid_id_sets,
+    mark_valid_sources,
+    stringify_item_keys,
+]
+
+
+def get_stages(
+    out_info_dir: Path,
+    server_data_dir: Path,
+    patch_names: list[str],
+    cache_dir: Optional[Path],
+    low_memory: bool = False,
+) -> list[Callable]:
+    return [
+        # the server data freed in low memory mode would otherwise stay alive in SERVER_DATA_CACHE
+        partial(
+            construct_drop_directory_data,
+            server_data_dir=server_data_dir,
+            patch_names=patch_names,
+            cache_dir=cache_dir,
+            keep_in_memory=not low_memory,
+        ),
+        *DERIVE_STAGES,
+        partial(export_json_source_info, out_info_dir),
+        partial(export_csv_source_info, out_info_dir),
+        partial(export_sqlite_source_info, out_info_dir),
+        partial(export_graph_source_info, out_info_dir),
+    ]
+
+
+def get_initial_sources(
+    xdt: dict,
+    areas: list,
+    extras: dict,
+    active_event: str,
+    is_retrobution: bool,
+    is_academy: bool,
+) -> dict:
+    return {
+        "areas": areas,
+        # tables are freed from this dict in low memory mode, leave the one handed over intact
+        "xdt": dict(xdt),
+        "is_retrobution": is_retrobution,
+        "is_academy": is_academy,
+        "active_event": active_event,
+        "extra_npcs": extras.get("extra_npcs", {}),
+        "extra_mobs": extras.get("extra_mobs", {}),
+        "extra_eggs": extras.get("extra_eggs", {}),
+    }
+
+
+def derive_sources(
+    xdt: dict,
+    areas: list,
+    server_data: dict,
+    extras: Optional[dict] = None,
+    active_event: str = "None",
+    is_retrobution: bool = False,
+    is_academy: bool = False,
+    keys: Optional[list[str]] = None,
+    export_hooks: Optional[list[Callable[[dict], None]]] = None,
+) -> dict:
+    # entry point for callers that already hold the parsed inputs, e.g. the server data from load_server_data
+    # nothing is written unless an export hook does, like partial(export_json_source_info, out_info_dir)
+    sources = get_initial_sources(xdt, areas, extras or {}, active_event, is_retrobution, is_academy)
+    sources.update(server_data)
+
+    if "drops_map" not in sources:
+        sources["drops_map"] = mapify_drops(sources["drops"])
+        sources["references"] = construct_references(sources["drops_map"])
+
+    for stage in DERIVE_STAGES:
+        stage(sources)
+
+    for export_hook in export_hooks or []:
+        export_hook(sources)
+
+    return sources if keys is None else {key: sources[key] for key in keys}
+
+
+def get_event_info_dirs(out_info_dir: Path, extras: dict) -> dict[str, Path]:
+    # the info without any event stays where it always was, every event of the extras gets a folder next to it
+    return {
+        event: out_info_dir if event == "None" else out_info_dir.with_name(f"{out_info_dir.name}-{event.lower()}")
+        for event in get_extras_events(extras)
+    }
+
+
+def load_event_tables(in_dir: Path, events: list[str]) -> dict[str, dict]:
+    # written next to xdt.json by the filter, events it kept nothing different for have no file
+    event_tables = {}
+
+    for event in events:
+        tables_path = in_dir / f"tables-{event.lower()}.json"
+
+        if tables_path.is_file():
+            with open(tables_path, "r") as f:
+                event_tables[event] = json.load(f)
+
+    return event_tables
+
+
 def extract_derived_info(
     in_dir: Path,
     out_info_dir: Path,
@@ -3247,89 +4279,317 @@ def extract_derived_info(
     patch_names: list[str],
     active_event: str,
     extras: dict,
+    cache_dir: Optional[Path] = None,
+    low_memory: bool = False,
+    memory_report: bool = False,
+    checkpoint_dir: Optional[Path] = None,
+    checkpoint_stages: Optional[list[str]] = None,
+    resume_from: Optional[str] = None,
+    stage_cache: bool = False,
+    build_sources: Optional[dict] = None,
+):
+    event_info_dirs = {active_event: out_info_dir}
+    event_tables = {}
+    if active_event == ALL_EVENTS:
+        if checkpoint_stages or resume_from:
+            raise ValueError(f"Checkpoints cannot tell the event variants of {in_dir.name} apart.")
+
+        event_info_dirs = get_event_info_dirs(out_info_dir, extras)
+        # the tables the filter kept differently for each event, applied over the ones without an event
+        if build_sources is None:
+            event_tables = load_event_tables(in_dir, list(event_info_dirs))
+        else:
+            event_tables = build_sources.get("events", {})
+
+    for info_dir in event_info_dirs.values():
+        info_dir.mkdir(parents=True, exist_ok=True)
+
+    stage_cache = stage_cache and cache_dir is not None
+
+    if memory_report:
+        reset_peak_rss()
+        start_rss = get_rss()[0]
+
+    stages = get_stages(out_info_dir, server_data_dir, patch_names, cache_dir, low_memory)
+    stage_names = [get_stage_name(stage) for stage in stages]
+    freed_size = 0
+    start_index = 0
+    digests = {}
+    server_data_keys = [*SERVER_DATA_NAMES, "drops_map", "references"]
+    cache_hits = 0
+
+    if resume_from:
+        start_index, sources = load_checkpoint(checkpoint_dir, stage_names, stage_names.index(resume_from))
+    else:
+        # the areas and xdt of the build can be handed over in memory instead of being read from in_dir
+        if build_sources is None:
+            with open(in_dir / "areas.json", "r") as f:
+                areas = json.load(f)
+
+            with open(in_dir / "xdt.json", "r") as f:
+                xdt = json.load(f)
+        elif low_memory:
+            # taken over from the caller, whose references would keep every freed table alive
+            areas, xdt = build_sources.pop("areas"), build_sources.pop("xdt")
+        else:
+            areas, xdt = build_sources["areas"], build_sources["xdt"]
+
+        sources = get_initial_sources(
+            xdt,
+            areas,
+            extras,
+            active_event,
+            "retrobution" in str(in_dir),
+            "beta-2011" in str(in_dir),
+        )
+        # sources holds the only references from here on
+        del areas, xdt
+
+    event_keys = {"active_event"}
+    for tables in event_tables.values():
+        event_keys.update(f"xdt.{table}" for table in tables["xdt"])
+        event_keys.update(["areas"] if "areas" in tables else [])
+
+    # the stages that do not depend on the event run once before the others, which run again for every event variant
+    event_stage_indices, event_writes = set(), set()
+    if active_event == ALL_EVENTS:
+        event_stage_indices, event_writes = get_event_stage_indices(stage_names, event_keys)
+
+    shared_indices = [i for i in range(start_index, len(stages)) if i not in event_stage_indices]
+    event_indices = [i for i in range(start_index, len(stages)) if i in event_stage_indices]
+    # positions in the order a single variant sees the stages, every variant starts again from the shared sources
+    positions = {i: position for position, i in enumerate([*shared_indices, *event_indices])}
+    last_uses = get_last_stage_uses([stages[i] for i in positions])
+    event_stages = {
+        event: get_stages(info_dir, server_data_dir, patch_names, cache_dir, low_memory)
+        for event, info_dir in event_info_dirs.items()
+    }
+    run = [(None, i) for i in shared_indices]
+    run.extend((event, i) for event in event_info_dirs for i in event_indices)
+    shared_sources = None
+    shared_snapshot = None
+    events_left = len(event_info_dirs)
+
+    for event, i in run:
+        if event is not None and i == event_indices[0]:
+            events_left -= 1
+
+            if shared_sources is None and events_left:
+                # only what the variants write is copied, the rest of the shared sources is handed to each of them as is
+                snapshot_keys = get_snapshot_keys(sources, event_writes)
+                shared_snapshot = pickle.dumps(
+                    {key: sources["xdt"][key[4:]] if key.startswith("xdt.") else sources[key] for key in snapshot_keys},
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                shared_sources = {key: None if key in snapshot_keys else value for key, value in sources.items()}
+                if "xdt" in sources:
+                    shared_sources["xdt"] = {
+                        table: None if f"xdt.{table}" in snapshot_keys else rows for table, rows in sources["xdt"].items()
+                    }
+                shared_digests = dict(digests)
+            elif shared_sources is not None:
+                # the previous variant updated the copied keys in place
+                sources = {**shared_sources}
+                if "xdt" in sources:
+                    sources["xdt"] = {**shared_sources["xdt"]}
+
+                for key, value in pickle.loads(shared_snapshot).items():
+                    if key.startswith("xdt."):
+                        sources["xdt"][key[4:]] = value
+                    else:
+                        sources[key] = value
+
+                digests = dict(shared_digests)
+
+                if not events_left:
+                    # the last variant frees what it is done with, nothing has to stay around for another one
+                    shared_sources = shared_snapshot = shared_digests = None
+
+            if event in event_tables:
+                # xdt may be gone in low memory mode if only the areas differ
+                sources.setdefault("xdt", {}).update(event_tables[event]["xdt"])
+                if "areas" in event_tables[event]:
+                    sources["areas"] = event_tables[event]["areas"]
+
+                for key in event_keys:
+                    digests.pop(key, None)
+
+            sources["active_event"] = event
+
+        stage = stages[i] if event is None else event_stages[event][i]
+        stage_name = stage_names[i]
+        cache_key = None
+
+        if stage_cache and stage_name in STAGE_WRITES:
+            cache_key = get_stage_cache_key(stage_name, sources, digests)
+
+        cache_path = cache_dir / "stages" / f"{cache_key}.pkl" if cache_key else None
+
+        if cache_path and restore_stage_output(cache_path, sources):
+            cache_hits += 1
+        else:
+            updated_keys = [key for key in STAGE_WRITES.get(stage_name, []) if key in sources]
+            updated_ids = index_source_objects(sources, updated_keys, with_paths=False)[1] if cache_path else set()
+            stage(sources)
+
+            if cache_path:
+                store_stage_output(cache_path, stage_name, sources, updated_ids)
+
+        if stage_cache:
+            if stage_name == "construct_drop_directory_data":
+                server_data_digest = get_server_data_digest(server_data_dir, patch_names)
+                digests.update((key, server_data_digest) for key in server_data_keys)
+            elif stage_name in STAGE_WRITES:
+                digests.update((key, cache_key) for key in STAGE_WRITES[stage_name])
+            else:
+                # uncached stages may update anything they reach in place, so derived keys are rehashed by content
+                digests = {
+                    key: digest
+                    for key, digest in digests.items()
+                    if key.startswith("xdt.") or key in server_data_keys
+                }
+
+        if low_memory:
+            rss_before_freeing = get_rss()[0] if memory_report else 0
+            free_dead_sources(sources, last_uses, positions[i])
+
+            if memory_report:
+                # only what the allocator actually gave back to the system counts
+                freed_size += max(0, rss_before_freeing - get_rss()[0])
+
+        if checkpoint_stages and stage_names[i] in checkpoint_stages:
+            save_checkpoint(checkpoint_dir, stage_names, i, sources)
+
+    if memory_report:
+        end_rss, peak_rss = get_rss()
+        report = (
+            f"{in_dir.name}: peak RSS {humanize.naturalsize(peak_rss)}, {humanize.naturalsize(start_rss)} before deriving "
+            f"and {humanize.naturalsize(end_rss)} after"
+        )
+
+        if low_memory:
+            report += f", {humanize.naturalsize(freed_size)} returned to the system by freeing"
+
+        tqdm.write(report)
+
+    if stage_cache:
+        cached_stage_count = sum(stage_names[i] in STAGE_WRITES for _, i in run)
+        tqdm.write(f"{in_dir.name}: {cache_hits} of {cached_stage_count} stages restored from the stage cache")
+
+
+def derive_build(
+    config_root: Path,
+    build_config: dict,
+    in_dir: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path] = None,
+    low_memory: bool = False,
+    memory_report: bool = False,
+    checkpoint_stages: Optional[list[str]] = None,
+    resume_from: Optional[str] = None,
+    stage_cache: bool = False,
+    build_sources: Optional[dict] = None,
+):
+    server_data_config = build_config["server-data"]
+    active_event = build_config.get("active_event", "None")
+
+    extras_path = config_root / f"extras-{in_dir.name}.yml"
+    extras = {}
+    if extras_path.is_file():
+        with open(extras_path, "r") as f:
+            extras = yaml.safe_load(f)
+
+    extract_derived_info(
+        in_dir,
+        in_dir / "info",
+        server_data_root / server_data_config["repository"].strip("/"),
+        server_data_config.get("patches", []),
+        active_event,
+        extras,
+        cache_root,
+        low_memory,
+        memory_report,
+        cache_root / "checkpoints" / in_dir.name if cache_root else None,
+        checkpoint_stages,
+        resume_from,
+        stage_cache,
+        build_sources,
+    )
+
+
+def main(
+    config_root: Path,
+    output_root: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path] = None,
+    low_memory: bool = False,
+    memory_report: bool = False,
+    checkpoint_stages: Optional[list[str]] = None,
+    resume_from: Optional[str] = None,
+    stage_cache: bool = False,
 ):
-    out_info_dir.mkdir(parents=True, exist_ok=True)
-
-    sources = {}
-
-    with open(in_dir / "areas.json", "r") as f:
-        sources["areas"] = json.load(f)
-
-    with open(in_dir / "xdt.json", "r") as f:
-        sources["xdt"] = json.load(f)
-
-    sources["is_retrobution"] = "retrobution" in str(in_dir)
-    sources["is_academy"] = "beta-2011" in str(in_dir)
-    sources["active_event"] = active_event
-    sources["extra_npcs"] = extras.get("extra_npcs", {})
-    sources["extra_mobs"] = extras.get("extra_mobs", {})
-    sources["extra_eggs"] = extras.get("extra_eggs", {})
-
-    construct_drop_directory_data(sources, server_data_dir, patch_names)
-    construct_area_data(sources)
-    construct_player_info_data(sources)
-    construct_item_info_data(sources)
-    construct_npc_mob_info_data(sources)
-    construct_egg_data(sources)
-    construct_mission_data(sources)
-    construct_instance_data(sources)
-    construct_transportation_data(sources)
-    construct_nano_data(sources)
-    construct_vendor_data(sources)
-    construct_ep_instance_data(sources)
-    construct_code_item_data(sources)
-    construct_combination_data(sources)
-    construct_egg_instance_region_grouped_data(sources)
-    construct_npc_instance_region_grouped_data(sources)
-    construct_mob_instance_region_grouped_data(sources)
-    construct_code_item_source_data(sources)
-    construct_vendor_source_data(sources)
-    construct_racing_source_data(sources)
-    construct_mob_event_source_data(sources)
-    construct_mission_reward_source_data(sources)
-    construct_egg_source_data(sources)
-    construct_crate_item_source_data(sources)
-    construct_crate_source_data(sources)
-    construct_item_source_data(sources)
-    construct_source_item_data(sources)
-    fill_area_info(sources)
-    construct_valid_id_sets(sources)
-    mark_valid_sources(sources)
-
-    export_json_source_info(out_info_dir, sources)
-    export_csv_source_info(out_info_dir, sources)
-    export_graph_source_info(out_info_dir, sources)
-
-
-def main(config_root: Path, output_root: Path, server_data_root: Path):
     with open(config_root / "build-config.yml", "r") as f:
         config = yaml.safe_load(f)["config"]
 
     in_dirs = [p for p in output_root.iterdir() if p.is_dir()]
     for in_dir in tqdm(in_dirs):
-        build_config = config[in_dir.name]
-        server_data_config = build_config["server-data"]
-        active_event = build_config.get("active_event", "None")
-
-        extras_path = config_root / f"extras-{in_dir.name}.yml"
-        extras = {}
-        if extras_path.is_file():
-            with open(extras_path, "r") as f:
-                extras = yaml.safe_load(f)
-
-        extract_derived_info(
+        derive_build(
+            config_root,
+            config[in_dir.name],
             in_dir,
-            in_dir / "info",
-            server_data_root / server_data_config["repository"].strip("/"),
-            server_data_config.get("patches", []),
-            active_event,
-            extras,
+            server_data_root,
+            cache_root,
+            low_memory,
+            memory_report,
+            checkpoint_stages,
+            resume_from,
+            stage_cache,
         )
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python extract_derived_info.py <config_root> <output_root> <server_data_root>")
-        sys.exit(1)
-
-    main(*map(Path, sys.argv[1:]))
+    parser = argparse.ArgumentParser(description="Derive info tables from the extracted game info of each build.")
+    parser.add_argument("config_root", type=Path)
+    parser.add_argument("output_root", type=Path)
+    parser.add_argument("server_data_root", type=Path)
+    parser.add_argument("cache_root", type=Path, nargs="?")
+    parser.add_argument("--low-memory", action="store_true", help="free intermediate data after the last stage reading it")
+    parser.add_argument("--memory-report", action="store_true", help="print the peak resident memory of each build, as measured by the kernel (linux only)")
+    parser.add_argument(
+        "--checkpoint",
+        action="append",
+        choices=list(STAGE_READS),
+        dest="checkpoint_stages",
+        metavar="STAGE",
+        help="snapshot the sources after this stage into <cache_root>/checkpoints, can be repeated",
+    )
+    parser.add_argument(
+        "--resume-from",
+        choices=list(STAGE_READS),
+        metavar="STAGE",
+        help="continue from the latest checkpoint taken before this stage",
+    )
+    parser.add_argument(
+        "--stage-cache",
+        action="store_true",
+        help="reuse stage outputs from <cache_root>/stages when the inputs of the stage are unchanged",
+    )
+    args = parser.parse_args()
+
+    if (args.checkpoint_stages or args.resume_from) and not args.cache_root:
+        parser.error("checkpoints are kept in <cache_root>, which is required for --checkpoint and --resume-from")
+
+    if args.stage_cache and not args.cache_root:
+        parser.error("stage outputs are kept in <cache_root>, which is required for --stage-cache")
+
+    main(
+        args.config_root,
+        args.output_root,
+        args.server_data_root,
+        args.cache_root,
+        args.low_memory,
+        args.memory_report,
+        args.checkpoint_stages,
+        args.resume_from,
+        args.stage_cache,
+    )
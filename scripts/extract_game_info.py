@@ -3,7 +3,7 @@ import json
 import traceback
 from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 from PIL import Image, ImageOps
 from tqdm import tqdm
@@ -121,7 +121,7 @@ def icon_bundle_extract(path: Path, outdir: Path):
         traceback.print_exc(file=sys.stdout)
 
 
-def xdt_bundle_extract(path: Path, outdir: Path):
+def xdt_bundle_read(path: Path) -> tuple[Optional[dict], Optional[list]]:
     with open(path / "TableData.resourceFile", "rb") as f:
         tabledata = unitypack.load(f).assets[0]
 
@@ -135,6 +135,8 @@ def xdt_bundle_extract(path: Path, outdir: Path):
         if None not in (xdtdata, areadata):
             break
 
+    out, areas = None, None
+
     if xdtdata:
         out = {}
         for tname, table in xdtdata.items():
@@ -145,9 +147,6 @@ def xdt_bundle_extract(path: Path, outdir: Path):
             except:
                 out[tname] = "<err>"
 
-        with open(outdir / "xdt.json", "w") as f:
-            json.dump(out, f, indent=4)
-
     if areadata:
         areas = [
             obj
@@ -155,6 +154,17 @@ def xdt_bundle_extract(path: Path, outdir: Path):
             if obj["Area"]["width"] * obj["Area"]["height"] > 0 and obj["DongName"] != "unknown"
         ]
 
+    return out, areas
+
+
+def xdt_bundle_extract(path: Path, outdir: Path):
+    out, areas = xdt_bundle_read(path)
+
+    if out is not None:
+        with open(outdir / "xdt.json", "w") as f:
+            json.dump(out, f, indent=4)
+
+    if areas is not None:
         with open(outdir / "areas.json", "w") as f:
             json.dump(areas, f, indent=4)
 
@@ -1,13 +1,21 @@
-import sys
+import os
+import ast
 import json
+import time
+import pickle
 import shutil
+import hashlib
+import argparse
 import traceback
 from collections import defaultdict
-from copy import deepcopy
+from copy import copy
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Callable, Optional
+from types import SimpleNamespace
+from typing import Any, Optional
 
 import yaml
+import numpy as np
 from tqdm import tqdm
 
 USE_EXCLUDED_IDS = "<excluded_ids>"
@@ -15,30 +23,34 @@ USE_INDEX = "<index>"
 USE_TYPE = "<type>"
 USE_TYPE_ID = "<type_id>"
 ITEM_CATEGORY = "item"
+LINK_MODES = ["hardlink", "reflink"]
+# active_event value that filters and derives the build once per event of its extras
+ALL_EVENTS = "All"
+# linux ioctl that makes a file share the extents of another, on btrfs and xfs
+FICLONE = 0x40049409
+
+# compiled plans by config digest, shared by the builds filtered in this process
+FILTER_PLANS = {}
 
 
 class FilterFuncs:
     @staticmethod
-    def area_include(source: list[dict], set_of_xywh: set[tuple[int, int, int, int]]) -> list[bool]:
-        # or logic over multiple areas
-        # include if completely inside any area
-        include_source = [False] * len(source)
+    def area_include(source: list[dict], set_of_xywh: set[tuple[int, int, int, int]]) -> np.ndarray:
+        if not source or not set_of_xywh:
+            return np.zeros(len(source), dtype=bool)
 
-        for x, y, w, h in set_of_xywh:
-            include_source = [
-                (
-                    truth or
-                    (
-                        x <= d["Area"]["x"] and
-                        y <= d["Area"]["y"] and
-                        x + w >= d["Area"]["x"] + d["Area"]["width"] and
-                        y + h >= d["Area"]["y"] + d["Area"]["height"]
-                    )
-                )
-                for truth, d in zip(include_source, source)
-            ]
+        # rows as columns, areas as rows
+        x, y, w, h = np.array([[d["Area"][k] for d in source] for k in ["x", "y", "width", "height"]]).reshape(4, 1, -1)
+        area_x, area_y, area_w, area_h = np.array(list(set_of_xywh)).T.reshape(4, -1, 1)
 
-        return include_source
+        # or logic over multiple areas
+        # include if completely inside any area
+        return (
+            (area_x <= x) &
+            (area_y <= y) &
+            (area_x + area_w >= x + w) &
+            (area_y + area_h >= y + h)
+        ).any(axis=0)
 
 
 class MapFuncs:
@@ -90,50 +102,151 @@ class MapFuncs:
         ]
 
 
+class CopyOnWriteSources:
+    def __init__(self, sources: dict):
+        # rows and untouched tables stay shared with the unfiltered sources
+        self.sources = copy(sources)
+        self.owned_ids = {id(self.sources)}
+
+    def get_writable(self, path: tuple[tuple[str, Optional[int]], ...]) -> Any:
+        d = self.sources
+
+        try:
+            for key, index in path:
+                key = index if isinstance(d, list) else key
+                child = d[key]
+
+                # containers on the path are copied the first time an exclude writes below them
+                if isinstance(child, (dict, list)) and id(child) not in self.owned_ids:
+                    child = copy(child)
+                    d[key] = child
+                    self.owned_ids.add(id(child))
+
+                d = child
+        except:
+            return None
+
+        return d
+
+
+class ColumnCache:
+    def __init__(self):
+        # only the unfiltered tables are cached, they live as long as the run anyway and holding them keeps their ids unique
+        self.tables = {}
+
+    def get_columns(self, table: list[dict]) -> dict:
+        if id(table) not in self.tables:
+            self.tables[id(table)] = (table, {})
+
+        return self.tables[id(table)][1]
+
+    def get_values(self, table: list[dict], path: tuple[tuple[str, Optional[int]], ...]) -> list[Any]:
+        columns = self.get_columns(table)
+
+        if ("values", path) not in columns:
+            columns[("values", path)] = [get_path(d, path) for d in table]
+
+        return columns[("values", path)]
+
+    def get_ints(self, table: list[dict], path: tuple[tuple[str, Optional[int]], ...]) -> Optional[np.ndarray]:
+        columns = self.get_columns(table)
+
+        if ("ints", path) not in columns:
+            columns[("ints", path)] = get_int_array(self.get_values(table, path))
+
+        return columns[("ints", path)]
+
+    def get_lists(self, table: list[dict], accessor: tuple[str, Any]) -> list[list[Any]]:
+        columns = self.get_columns(table)
+
+        if ("lists", accessor) not in columns:
+            kind, arg = accessor
+
+            if kind == "func":
+                lists = getattr(MapFuncs, arg)(table)
+            elif kind == "index":
+                lists = [[i] for i in range(len(table))]
+            else:
+                lists = [val if isinstance(val, list) else [val] for val in self.get_values(table, arg)]
+
+            columns[("lists", accessor)] = lists
+
+        return columns[("lists", accessor)]
+
+    def get_usages(self, table: list[dict], accessor: tuple[str, Any], usage_accessor: tuple[str, Any]) -> dict[Any, set[Any]]:
+        columns = self.get_columns(table)
+
+        if ("usages", accessor, usage_accessor) not in columns:
+            usages = defaultdict(set)
+
+            for erase_ids, usage_ids in zip(self.get_lists(table, accessor), self.get_lists(table, usage_accessor)):
+                for erase_id in erase_ids:
+                    usages[erase_id].update(usage_ids)
+
+            columns[("usages", accessor, usage_accessor)] = dict(usages)
+
+        return columns[("usages", accessor, usage_accessor)]
+
+
+def remove_files(out_dir: Path, files: set[str] | set[Path]):
+    for file in files:
+        file_path = out_dir / file
+
+        if file_path.is_file():
+            file_path.unlink()
+
+
 class ExcludeFuncs:
     @staticmethod
     def icon_dir(context: dict, exclude_ids: set[str]) -> None:
-        for icon_file in exclude_ids:
-            icon_file_path = Path(context["out_dir"]) / icon_file
+        # the output directory is only linked after filtering, excluded icons are left out of it
+        if context["excluded_files"] is not None:
+            context["excluded_files"].update(Path(icon_file) for icon_file in exclude_ids)
+            return
+
+        remove_files(Path(context["out_dir"]), exclude_ids)
 
-            if icon_file_path.is_file():
-                icon_file_path.unlink()
 
+def parse_path(config: str) -> tuple[tuple[str, Optional[int]], ...]:
+    path = []
+
+    for key in config.split("."):
+        if key:
+            try:
+                index = int(key)
+            except ValueError:
+                index = None
+
+            path.append((key, index))
+
+    return tuple(path)
 
-def split_get(d: dict, config: str) -> Any:
-    dc = d
 
+def get_path(d: Any, path: tuple[tuple[str, Optional[int]], ...]) -> Any:
     try:
-        for key in config.split("."):
-            if key:
-                conv = int if isinstance(dc, list) else str
-                dc = dc[conv(key)]
+        for key, index in path:
+            d = d[index if isinstance(d, list) else key]
     except:
         return None
 
-    return dc
+    return d
 
 
-def resolve_from_context(context: dict, config: str | list) -> list:
-    if isinstance(config, list):
-        return config
+def resolve_from_context(context: dict, values: dict) -> list:
+    # a fresh list every time, excludes compact what they resolve in place and the plan is cached between builds
+    if values["literal"] is not None:
+        return list(values["literal"])
 
-    union_pieces = [pc.strip() for pc in config.split("+")]
     result = []
 
-    for piece in union_pieces:
+    for piece, possible_list in values["pieces"]:
         if piece in context:
             if isinstance(context[piece], list):
                 result.extend(context[piece])
             else:
                 result.append(context[piece])
-        else:
-            try:
-                possible_list = eval(piece)
-                if isinstance(possible_list, list):
-                    result.extend(possible_list)
-            except:
-                pass
+        elif possible_list is not None:
+            result.extend(possible_list)
 
     return result
 
@@ -148,190 +261,445 @@ def resolve_template_string(context: dict, template_string: str) -> str:
     return template_string
 
 
-def filter_from_config(config: str, list_of_ids: list[Any]) -> Callable[[list[dict]], list[bool]]:
-    set_of_ids = {(tuple(idx) if isinstance(idx, list) else idx) for idx in list_of_ids}
+def is_func_config(config: str) -> bool:
+    return config.startswith("<") and config.endswith(">") and config != USE_INDEX
 
-    def getter(i: int, d: dict) -> list[Any]:
-        if config == USE_INDEX:
-            return [i]
 
-        val = split_get(d, config)
-        return val if isinstance(val, list) else [val]
+@lru_cache(maxsize=None)
+def parse_list_literal(piece: str) -> Optional[list]:
+    try:
+        possible_list = ast.literal_eval(piece)
+    except Exception:
+        return None
 
-    def filter_func(l_d: list[dict]) -> list[bool]:
-        if config.startswith("<") and config.endswith(">") and config != USE_INDEX:
-            return getattr(FilterFuncs, config[1:-1])(l_d, set_of_ids)
+    return possible_list if isinstance(possible_list, list) else None
 
-        # include if inside ids
-        return [any(v in set_of_ids for v in getter(i, d)) for i, d in enumerate(l_d)]
 
-    return filter_func
+def is_context_piece(piece: str) -> bool:
+    return (piece.startswith("<") and piece.endswith(">")) or piece.endswith(".ids") or piece in ["out_dir", "trace", "active_event", "excluded_files"]
 
 
-def map_from_config(config: str) -> Callable[[list[dict]], list[list[Any]]]:
-    def getter(i: int, d: dict) -> list[Any]:
-        if config == USE_INDEX:
-            return [i]
+def compile_values(config: str | list) -> dict:
+    if isinstance(config, list):
+        return {"literal": tuple(config), "pieces": ()}
 
-        val = split_get(d, config)
-        return val if isinstance(val, list) else [val]
+    # list literals are parsed here once, the rest are looked up in the context when run
+    pieces = [pc.strip() for pc in config.split("+")]
+    return {"literal": None, "pieces": tuple((piece, parse_list_literal(piece)) for piece in pieces)}
 
-    def map_func(l_d: list[dict]) -> list[list[Any]]:
-        if config.startswith("<") and config.endswith(">") and config != USE_INDEX:
-            return getattr(MapFuncs, config[1:-1])(l_d)
 
-        return [getter(i, d) for i, d in enumerate(l_d)]
+def compile_source(config: str) -> dict:
+    return {
+        "config": config,
+        "values": compile_values(config),
+        # templated paths like xdt.m_p<type>ItemTable depend on the category, they are parsed when run
+        "path": None if "<" in config else parse_path(config),
+        "func": config[1:-1] if is_func_config(config) else None,
+        "xdt": config.startswith("xdt"),
+    }
 
-    return map_func
 
+def compile_accessor(config: str) -> tuple[str, Any]:
+    if config == USE_INDEX:
+        return ("index", None)
 
-def operator_take_from(context: dict, all_sources: dict, from_config: str) -> Optional[list[dict]]:
-    return resolve_from_context(context, from_config) or split_get(all_sources, resolve_template_string(context, from_config))
+    if is_func_config(config):
+        return ("func", config[1:-1])
 
+    return ("path", parse_path(config))
 
-def operator_filter(context: dict, source: Optional[list[dict]], filter_config: list[dict]) -> list[bool]:
-    if source is None:
-        return []
 
-    # and logic over multiple filters
-    include_source = [True] * len(source)
+def compile_leaf_step(step_name: str, step_config: dict, trace: str) -> dict:
+    ids_config = step_config["ids"]
+    exclude_config = step_config["exclude"]
+    exclude_from = compile_source(exclude_config["from"])
+
+    return {
+        "name": step_name,
+        "trace": trace,
+        "ids": {
+            "from": compile_source(ids_config["from"]),
+            "filter": [
+                (compile_accessor(filter_cfg["by"]), compile_values(filter_cfg["values"]))
+                for filter_cfg in ids_config["filter"]
+            ],
+            "map": [
+                (
+                    compile_accessor(map_cfg["key"]),
+                    compile_accessor(map_cfg["register_usages_by"]) if map_cfg.get("register_usages_by") else None,
+                )
+                for map_cfg in ids_config["map"]
+            ],
+        },
+        "exclude": {
+            "from": exclude_from,
+            "matching": None if exclude_from["func"] else compile_accessor(exclude_config["matching"]),
+        },
+        "skip_extras": step_config.get("skip_extras", False),
+        # the <step>.ids context entries this step reads, which earlier steps have to write
+        "requires": sorted({
+            piece
+            for values in [compile_values(ids_config["from"])] + [compile_values(f["values"]) for f in ids_config["filter"]]
+            for piece, _ in values["pieces"]
+            if piece.endswith(".ids")
+        }),
+        # ids that read the event from the context are computed again for every event, see run_event_steps
+        "event_dependent": any(
+            piece in ["active_event", "excluded_files"]
+            for values in [compile_values(ids_config["from"])] + [compile_values(f["values"]) for f in ids_config["filter"]]
+            for piece, _ in values["pieces"]
+        ),
+        # values pieces that resolve to nothing, neither context entries nor list literals
+        "unresolved": sorted({
+            piece
+            for filter_cfg in ids_config["filter"]
+            for piece, possible_list in compile_values(filter_cfg["values"])["pieces"]
+            if possible_list is None and not is_context_piece(piece)
+        }),
+    }
+
+
+def compile_step(how_config: dict, step_name: str, step_config: dict, trace: str, expanding: tuple[str, ...] = ()) -> list[dict]:
+    if "run_steps" not in step_config:
+        return [compile_leaf_step(step_name, step_config, trace)]
+
+    run_steps = step_config["run_steps"]
+    if run_steps in expanding:
+        raise ValueError(f"run_steps cycle through {run_steps}")
+
+    copied_steps = {name: dict(config) for name, config in how_config[run_steps].items()}
+
+    if "override" in step_config:
+        for key, value in step_config["override"].items():
+            copied_steps[key].update(value)
+
+    return [
+        leaf_step
+        for copied_step_name, copied_step_config in copied_steps.items()
+        for leaf_step in compile_step(
+            how_config, copied_step_name, copied_step_config, f"{trace}.{copied_step_name}", expanding + (run_steps,)
+        )
+    ]
+
+
+def compile_filter_plan(how_config: dict) -> dict[str, list[dict]]:
+    plan = {}
+
+    for how_key, steps in how_config.items():
+        plan[how_key] = []
+        written_ids = set()
+
+        for step_name, step_config in steps.items():
+            try:
+                leaf_steps = compile_step(how_config, step_name, step_config, step_name)
+            except Exception as e:
+                raise ValueError(f"Cannot compile filter step {how_key}.{step_name}: {e!r}") from e
+
+            for leaf_step in leaf_steps:
+                for required in leaf_step["requires"]:
+                    if required not in written_ids:
+                        print(f"WARNING: filter step {how_key}.{leaf_step['trace']} reads {required}, which no earlier step writes")
+
+                for piece in leaf_step["unresolved"]:
+                    print(f"WARNING: filter step {how_key}.{leaf_step['trace']} has values {piece!r}, which is neither a context entry nor a list literal")
+
+                written_ids.add(f"{leaf_step['name']}.ids")
+
+            # a failing step skips the rest of its run_steps expansion, but not the steps after it
+            plan[how_key].append({"trace": step_name, "steps": leaf_steps})
+
+    return plan
+
+
+def get_filter_plan_digest(how_config: dict) -> str:
+    hasher = hashlib.sha256(Path(__file__).read_bytes())
+    hasher.update(json.dumps(how_config, sort_keys=True).encode())
+    return hasher.hexdigest()
+
+
+def load_filter_plan(how_config: dict, plan_cache_dir: Optional[Path] = None) -> dict[str, list[dict]]:
+    digest = get_filter_plan_digest(how_config)
+
+    if digest in FILTER_PLANS:
+        return FILTER_PLANS[digest]
+
+    plan_path = plan_cache_dir / f"{digest}.pkl" if plan_cache_dir else None
+
+    if plan_path is not None and plan_path.is_file():
+        with open(plan_path, "rb") as f:
+            plan = pickle.load(f)
+    else:
+        plan = compile_filter_plan(how_config)
+
+        if plan_path is not None:
+            plan_cache_dir.mkdir(parents=True, exist_ok=True)
+            # several builds may compile the same plan at once
+            temp_path = plan_path.with_name(f".{plan_path.name}.{os.getpid()}.tmp")
+
+            with open(temp_path, "wb") as f:
+                pickle.dump(plan, f)
+
+            os.replace(temp_path, plan_path)
+
+    FILTER_PLANS[digest] = plan
+    return plan
+
+
+def get_filter_ids_fingerprint(all_config: dict, sources_digest: str, active_event: str) -> str:
+    hasher = hashlib.sha256(get_filter_plan_digest(all_config["how"]).encode())
+    writer = SimpleNamespace(write=hasher.update)
+    pickle.dump(
+        (all_config["exclude"], all_config["extras"], active_event, sources_digest), writer, protocol=pickle.HIGHEST_PROTOCOL
+    )
+    return hasher.hexdigest()
+
+
+def load_filter_ids(ids_path: Path, fingerprint: str) -> dict[str, set[Any]]:
+    if not ids_path.is_file():
+        return {}
+
+    with open(ids_path, "rb") as f:
+        cached = pickle.load(f)
+
+    # any change to the sources or the configs of the build invalidates every step
+    return cached["ids"] if cached["fingerprint"] == fingerprint else {}
+
+
+def save_filter_ids(ids_path: Path, fingerprint: str, step_ids: dict[str, set[Any]]):
+    ids_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = ids_path.with_name(f".{ids_path.name}.{os.getpid()}.tmp")
+
+    with open(temp_path, "wb") as f:
+        pickle.dump({"fingerprint": fingerprint, "ids": step_ids}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temp_path, ids_path)
+
+
+def get_int_array(vals: list[Any]) -> Optional[np.ndarray]:
+    # only plain integer columns compare the same way as arrays, anything else keeps python equality
+    if not all(type(val) is int for val in vals):
+        return None
+
+    try:
+        return np.array(vals, dtype=np.int64)
+    except OverflowError:
+        return None
+
+
+def get_int_ids(set_of_ids: set[Any]) -> np.ndarray:
+    int_ids = [
+        int(idx)
+        for idx in set_of_ids
+        if isinstance(idx, int) or (isinstance(idx, float) and idx.is_integer())
+    ]
+    return np.array([idx for idx in int_ids if -(1 << 63) <= idx < (1 << 63)], dtype=np.int64)
+
+
+def filter_with_accessor(accessor: tuple[str, Any], list_of_ids: list[Any], l_d: list[dict], column_cache: ColumnCache) -> np.ndarray:
+    set_of_ids = {(tuple(idx) if isinstance(idx, list) else idx) for idx in list_of_ids}
+    kind, arg = accessor
+
+    if kind == "func":
+        return np.asarray(getattr(FilterFuncs, arg)(l_d, set_of_ids), dtype=bool)
+
+    if kind == "index":
+        column = np.arange(len(l_d), dtype=np.int64)
+    else:
+        column = column_cache.get_ints(l_d, arg)
 
-    for filter_cfg in filter_config:
-        by_config = filter_cfg["by"]
-        values_config = filter_cfg["values"]
+        if column is None:
+            # list or mixed values, include if any of them is inside ids
+            return np.fromiter(
+                (any(v in set_of_ids for v in vals) for vals in column_cache.get_lists(l_d, accessor)),
+                dtype=bool,
+                count=len(l_d),
+            )
 
-        list_of_ids = resolve_from_context(context, values_config)
-        by_func = filter_from_config(by_config, list_of_ids)
-        by_source = by_func(source)
+    # include if inside ids
+    return np.isin(column, get_int_ids(set_of_ids))
+
+
+def get_source_path(context: dict, source_plan: dict) -> tuple[tuple[str, Optional[int]], ...]:
+    if source_plan["path"] is None:
+        return parse_path(resolve_template_string(context, source_plan["config"]))
+
+    return source_plan["path"]
+
+
+def operator_filter(context: dict, source: Optional[list[dict]], filter_plan: list[tuple], column_cache: ColumnCache) -> np.ndarray:
+    if source is None:
+        return np.zeros(0, dtype=bool)
+
+    include_source = np.ones(len(source), dtype=bool)
+
+    for accessor, values in filter_plan:
+        list_of_ids = resolve_from_context(context, values)
 
         # and logic over multiple filters
-        include_source = [
-            truth and next_truth
-            for truth, next_truth in zip(include_source, by_source)
-        ]
+        include_source &= filter_with_accessor(accessor, list_of_ids, source, column_cache)
 
     return include_source
 
 
-def operator_map_to_unused_ids(source: Optional[list[dict]], include_source: list[bool], map_config: list[dict]) -> set[Any]:
+def operator_map_to_unused_ids(
+    source: Optional[list[dict]],
+    include_source: list[bool],
+    map_plan: list[tuple],
+    column_cache: ColumnCache,
+) -> set[Any]:
     if source is None:
         return set()
 
     global_ids = set()
+    # map entries of a step share the include mask, so each usage key is collected once
+    included_usage_id_sets = {}
 
-    for map_cfg in map_config:
-        usages = defaultdict(set)
-
-        val_getter = map_from_config(map_cfg["key"])
-        register_usages_by = map_cfg.get("register_usages_by")
-
-        erase_id_lists = val_getter(source)
+    for accessor, usage_accessor in map_plan:
+        erase_id_lists = column_cache.get_lists(source, accessor)
+        usages = {}
         included_usage_id_set = set()
 
-        if register_usages_by:
-            usage_key_getter = map_from_config(register_usages_by)
-            usage_id_lists = usage_key_getter(source)
+        if usage_accessor:
+            usages = column_cache.get_usages(source, accessor, usage_accessor)
 
-            for erase_ids, usage_ids, include in zip(erase_id_lists, usage_id_lists, include_source):
-                if include:
-                    included_usage_id_set.update(usage_ids)
+            if usage_accessor not in included_usage_id_sets:
+                included_usage_id_sets[usage_accessor] = {
+                    usage_id
+                    for usage_ids, include in zip(column_cache.get_lists(source, usage_accessor), include_source)
+                    if include
+                    for usage_id in usage_ids
+                }
 
-                for erase_id in erase_ids:
-                    usages[erase_id].update(usage_ids)
+            included_usage_id_set = included_usage_id_sets[usage_accessor]
 
-        current_ids = {
+        included_erase_ids = {
             erase_id
             for erase_ids, include in zip(erase_id_lists, include_source)
+            if include
             for erase_id in erase_ids
-            # make sure that there isn't a usage that is not included
-            if include and (erase_id not in usages or included_usage_id_set.issuperset(usages[erase_id]))
         }
 
-        global_ids.update(current_ids)
+        global_ids.update(
+            erase_id
+            for erase_id in included_erase_ids
+            # make sure that there isn't a usage that is not included
+            if erase_id not in usages or included_usage_id_set.issuperset(usages[erase_id])
+        )
 
     return global_ids
 
 
-def operator_ids(context: dict, all_sources: dict, ids_config: dict) -> set[Any]:
-    from_config = ids_config["from"]
-    filter_config = ids_config["filter"]
-    map_config = ids_config["map"]
-
-    source = operator_take_from(context, all_sources, from_config)
-    include_source = operator_filter(context, source, filter_config)
-    return operator_map_to_unused_ids(source, include_source, map_config)
-
+def operator_ids(context: dict, all_sources: dict, ids_plan: dict, column_cache: ColumnCache) -> tuple[set[Any], int]:
+    source = resolve_from_context(context, ids_plan["from"]["values"])
 
-def operator_exclude(context: dict, all_sources: dict, exclude_config: dict, exclude_ids: set[Any]) -> None:
-    from_config = exclude_config["from"]
-    is_xdt_mode = from_config.startswith("xdt")
-
-    if from_config.startswith("<") and from_config.endswith(">"):
-        getattr(ExcludeFuncs, from_config[1:-1])(context, exclude_ids)
-        return
+    if source:
+        # lists resolved from the context are new on every step, only the columns of the unfiltered tables are kept
+        column_cache = ColumnCache()
+    else:
+        source = get_path(all_sources, get_source_path(context, ids_plan["from"]))
 
-    source = operator_take_from(context, all_sources, from_config)
+    include_source = operator_filter(context, source, ids_plan["filter"], column_cache)
+    ids = operator_map_to_unused_ids(source, include_source.tolist(), ids_plan["map"], column_cache)
+    return ids, len(source or [])
 
-    if source is None:
-        return
 
-    matching_config = exclude_config["matching"]
-    val_getter = map_from_config(matching_config)
-    val_lists = val_getter(source)
+def operator_exclude(
+    context: dict,
+    modified_sources: CopyOnWriteSources,
+    exclude_plan: dict,
+    exclude_ids: set[Any],
+) -> tuple[int, int]:
+    source_plan = exclude_plan["from"]
 
-    new_source = []
-    index_repeat = 0
-    dummy_obj = source[0]
+    if source_plan["func"]:
+        getattr(ExcludeFuncs, source_plan["func"])(context, exclude_ids)
+        return 0, 0
 
-    for val_list, d in zip(val_lists, source):
-        # if xdt mode, only nonzero and nonempty values are included
-        if not any(v in exclude_ids for v in val_list):
-            if matching_config == USE_INDEX and is_xdt_mode:
-                new_source.extend([dummy_obj] * index_repeat)
-                index_repeat = 0
+    source = (
+        resolve_from_context(context, source_plan["values"]) or
+        modified_sources.get_writable(get_source_path(context, source_plan))
+    )
 
-            new_source.append(d)
-        elif matching_config == USE_INDEX and is_xdt_mode:
-            index_repeat += 1
+    return exclude_rows(source, exclude_plan, exclude_ids)
 
-    source.clear()
-    source.extend(new_source)
 
+def exclude_rows(source: Optional[list], exclude_plan: dict, exclude_ids: set[Any]) -> tuple[int, int]:
+    if source is None:
+        return 0, 0
 
-def operator_step(context: dict, all_sources: dict, modified_sources: dict, step_name: str, step_config: dict, how_config: dict, extras_ids: set[Any]) -> None:
-    if "run_steps" in step_config:
-        copied_steps = deepcopy(how_config[step_config["run_steps"]])
+    matching_accessor = exclude_plan["matching"]
+    by_xdt_index = matching_accessor[0] == "index" and exclude_plan["from"]["xdt"]
+    # the table is a copy or a list from the context, neither is read again before it is compacted, so nothing is cached
+    val_lists = ColumnCache().get_lists(source, matching_accessor)
 
-        if "override" in step_config:
-            for key, value in step_config["override"].items():
-                copied_steps[key].update(value)
+    # compact in place, kept rows are moved down over the excluded ones
+    scanned_rows = len(source)
+    write_index = 0
+    excluded_rows = 0
+    dummy_obj = source[0]
 
-        for copied_step_name, copied_step_config in copied_steps.items():
-            old_trace = context["trace"]
-            context["trace"] = f"{old_trace}.{copied_step_name}"
-            operator_step(context, all_sources, modified_sources, copied_step_name, copied_step_config, how_config, extras_ids)
-            context["trace"] = old_trace
+    for read_index, val_list in zip(range(len(source)), val_lists):
+        if any(v in exclude_ids for v in val_list):
+            excluded_rows += 1
+            continue
+
+        # if xdt mode, excluded rows before a kept row become dummies, so that kept rows keep their index
+        if by_xdt_index:
+            for dummy_index in range(write_index, read_index):
+                source[dummy_index] = dummy_obj
+
+            write_index = read_index
+
+        source[write_index] = source[read_index]
+        write_index += 1
+
+    del source[write_index:]
+    return scanned_rows, excluded_rows
+
+
+def operator_step(
+    context: dict,
+    all_sources: dict,
+    modified_sources: CopyOnWriteSources,
+    column_cache: ColumnCache,
+    step_stats: list[dict],
+    step_plan: dict,
+    trace_prefix: str,
+    extras_ids: set[Any],
+    step_ids: dict[str, set[Any]],
+) -> None:
+    trace = f"{trace_prefix}.{step_plan['trace']}"
+    # added first, so that a failing step still shows up with what it got through
+    stat = {"trace": trace, "seconds": 0.0}
+    step_stats.append(stat)
+
+    context["trace"] = f"{trace}.ids"
+    start = time.perf_counter()
+    if trace in step_ids:
+        # ids cached by an earlier run on the same sources and configs
+        exclude_ids, stat["ids_rows_scanned"] = step_ids[trace], 0
     else:
-        ids_config = step_config["ids"]
-        exclude_config = step_config["exclude"]
-        skip_extras = step_config.get("skip_extras", False)
-
-        old_trace = context["trace"]
-        context["trace"] = f"{old_trace}.ids"
-        exclude_ids = operator_ids(context, all_sources, ids_config)
-        if skip_extras:
+        exclude_ids, stat["ids_rows_scanned"] = operator_ids(context, all_sources, step_plan["ids"], column_cache)
+        if step_plan["skip_extras"]:
             # do not exclude ids specified in the extras config
             exclude_ids = exclude_ids - extras_ids
-        context[f"{step_name}.ids"] = list(exclude_ids)
-
-        context["trace"] = f"{old_trace}.exclude"
-        operator_exclude(context, modified_sources, exclude_config, exclude_ids)
-        context["trace"] = old_trace
-
-
-def run_all_steps(global_context: dict, all_sources: dict, all_config: dict) -> dict[str, Any]:
+        step_ids[trace] = exclude_ids
+    context[f"{step_plan['name']}.ids"] = list(exclude_ids)
+    stat["ids"] = len(exclude_ids)
+    stat["ids_seconds"] = time.perf_counter() - start
+
+    context["trace"] = f"{trace}.exclude"
+    start = time.perf_counter()
+    stat["exclude_rows_scanned"], stat["rows_excluded"] = operator_exclude(
+        context, modified_sources, step_plan["exclude"], exclude_ids
+    )
+    stat["exclude_seconds"] = time.perf_counter() - start
+    stat["seconds"] = stat["ids_seconds"] + stat["exclude_seconds"]
+    context["trace"] = trace
+
+
+def get_exclude_contexts(global_context: dict, all_config: dict) -> list[tuple[str, str, dict, set[Any]]]:
     exclude_config = all_config["exclude"]
-    how_config = all_config["how"]
     extras_config = all_config["extras"]
 
     type_to_id = {
@@ -351,7 +719,7 @@ def run_all_steps(global_context: dict, all_sources: dict, all_config: dict) ->
         "shiny": ["extra_eggs"],
     }
 
-    modified_sources = deepcopy(all_sources)
+    exclude_contexts = []
 
     for exclude_key, excluded_ids in exclude_config.items():
         how_key = exclude_key
@@ -374,27 +742,216 @@ def run_all_steps(global_context: dict, all_sources: dict, all_config: dict) ->
                 USE_TYPE_ID: [type_to_id[type_name]],
             })
 
-        for step_name, step_config in how_config[how_key].items():
-            context["trace"] = f"{exclude_key}.{step_name}"
+        exclude_contexts.append((exclude_key, how_key, context, extras_ids))
+
+    return exclude_contexts
+
+
+def run_all_steps(
+    global_context: dict,
+    all_sources: dict,
+    all_config: dict,
+    plan: dict[str, list[dict]],
+    step_ids: dict[str, set[Any]],
+    column_cache: ColumnCache,
+) -> tuple[dict[str, Any], list[dict]]:
+    modified_sources = CopyOnWriteSources(all_sources)
+    step_stats = []
+
+    for exclude_key, how_key, context, extras_ids in get_exclude_contexts(global_context, all_config):
+        for step_group in plan[how_key]:
+            context["trace"] = f"{exclude_key}.{step_group['trace']}"
             try:
-                operator_step(context, all_sources, modified_sources, step_name, step_config, how_config, extras_ids)
+                for step_plan in step_group["steps"]:
+                    operator_step(
+                        context,
+                        all_sources,
+                        modified_sources,
+                        column_cache,
+                        step_stats,
+                        step_plan,
+                        exclude_key,
+                        extras_ids,
+                        step_ids,
+                    )
             except Exception as e:
+                step_stats[-1]["error"] = f"{context['trace']}: {e}"
                 print(f"\nError in step {context['trace']}: {e}\n")
                 traceback.print_exc()
             context["trace"] = exclude_key
 
-    return modified_sources
+    if step_stats:
+        slowest_stats = sorted(step_stats, key=lambda stat: stat["seconds"], reverse=True)[:3]
+        print(
+            f"Excluded {sum(stat.get('rows_excluded', 0) for stat in step_stats)} rows in {len(step_stats)} steps "
+            f"({sum(stat['seconds'] for stat in step_stats):.3f}s), slowest: "
+            + ", ".join(f"{stat['trace']} ({stat.get('rows_excluded', 0)} rows, {stat['seconds']:.3f}s)" for stat in slowest_stats)
+        )
 
+    return modified_sources.sources, step_stats
 
-def filter_game_info(config_how_path: Path, config_exclude_path: Path, config_extras_path: Path, in_dir: Path, out_dir: Path, active_event: str):
-    shutil.copytree(in_dir, out_dir)
 
-    out_areas_path = out_dir / "areas.json"
-    out_xdt_path = out_dir / "xdt.json"
+def get_exclude_unit(path: tuple[tuple[str, Optional[int]], ...]) -> tuple[tuple[str, Optional[int]], ...]:
+    # the tables of the xdt and the areas, the parts of the sources an event variant replaces as a whole
+    return path[:2] if path[:1] == (("xdt", None),) else path[:1]
 
-    if not config_how_path.is_file() or not config_exclude_path.is_file():
+
+def change_exclude_unit(
+    event_sources: CopyOnWriteSources,
+    unit_excludes: dict[tuple, list[tuple]],
+    changed_units: set[tuple],
+    unit: tuple,
+) -> None:
+    if unit in changed_units:
         return
 
+    changed_units.add(unit)
+
+    # until now the unit got the same excludes as in the base pass, from here on they run for the event
+    for path, exclude_plan, exclude_ids in unit_excludes.pop(unit, []):
+        try:
+            exclude_rows(event_sources.get_writable(path), exclude_plan, exclude_ids)
+        except Exception:
+            # failed the same way in the base pass, which kept what it had compacted until then
+            pass
+
+
+def run_event_steps(
+    global_context: dict,
+    all_sources: dict,
+    base_sources: dict[str, Any],
+    all_config: dict,
+    plan: dict[str, list[dict]],
+    base_ids: dict[str, set[Any]],
+    base_stats: list[dict],
+    step_ids: dict[str, set[Any]],
+    column_cache: ColumnCache,
+) -> tuple[dict[str, Any], bool]:
+    # only steps that skip extras, read the event or read ids the event changed can get other ids than the base pass,
+    # and only the tables those steps exclude from are filtered again, starting from the unfiltered ones
+    base_exclude_errors = {stat["trace"]: stat["error"] for stat in base_stats if "error" in stat and "ids" in stat}
+    event_sources = CopyOnWriteSources(all_sources)
+    unit_excludes = defaultdict(list)
+    changed_units = set()
+    ids_failed = False
+    computed_steps = 0
+
+    for exclude_key, how_key, context, extras_ids in get_exclude_contexts(global_context, all_config):
+        # the <step>.ids context entries that differ from the ones of the base pass
+        changed_ids = set()
+
+        for step_group in plan[how_key]:
+            context["trace"] = f"{exclude_key}.{step_group['trace']}"
+            step_index = 0
+            try:
+                for step_index, step_plan in enumerate(step_group["steps"]):
+                    trace = f"{exclude_key}.{step_plan['trace']}"
+                    ids_key = f"{step_plan['name']}.ids"
+
+                    context["trace"] = f"{trace}.ids"
+                    if trace in step_ids:
+                        exclude_ids = step_ids[trace]
+                    elif trace in base_ids and not step_plan["event_dependent"] and changed_ids.isdisjoint(step_plan["requires"]):
+                        # the extras of the event include the ones without an event, which the base ids already left out
+                        exclude_ids = base_ids[trace] - extras_ids if step_plan["skip_extras"] else base_ids[trace]
+                    else:
+                        computed_steps += 1
+                        try:
+                            exclude_ids, _ = operator_ids(context, all_sources, step_plan["ids"], column_cache)
+                        except Exception:
+                            ids_failed = True
+                            raise
+                        if step_plan["skip_extras"]:
+                            exclude_ids = exclude_ids - extras_ids
+
+                    changed = exclude_ids != base_ids.get(trace)
+                    if changed:
+                        changed_ids.add(ids_key)
+                    else:
+                        # the same set keeps the order of the context list
+                        exclude_ids = base_ids[trace]
+                        changed_ids.discard(ids_key)
+                    step_ids[trace] = exclude_ids
+                    context[ids_key] = list(exclude_ids)
+
+                    context["trace"] = f"{trace}.exclude"
+                    source_plan = step_plan["exclude"]["from"]
+                    if source_plan["func"] or resolve_from_context(context, source_plan["values"]):
+                        # excluded files are collected per event, lists from the context are not kept anyway
+                        operator_exclude(context, event_sources, step_plan["exclude"], exclude_ids)
+                    else:
+                        path = get_source_path(context, source_plan)
+                        unit = get_exclude_unit(path)
+
+                        if changed:
+                            change_exclude_unit(event_sources, unit_excludes, changed_units, unit)
+
+                        if unit in changed_units:
+                            exclude_rows(event_sources.get_writable(path), step_plan["exclude"], exclude_ids)
+                        else:
+                            unit_excludes[unit].append((path, step_plan["exclude"], exclude_ids))
+
+                            # the same exclude on the same table as in the base pass, so it fails the same way
+                            if trace in base_exclude_errors:
+                                raise RuntimeError(base_exclude_errors[trace])
+                    context["trace"] = trace
+            except Exception as e:
+                print(f"\nError in step {context['trace']}: {e}\n")
+                traceback.print_exc()
+
+                # the rest of the group is skipped, but the base pass may have run it
+                for skipped_plan in step_group["steps"][step_index:]:
+                    changed_ids.add(f"{skipped_plan['name']}.ids")
+
+                    if not skipped_plan["exclude"]["from"]["func"]:
+                        skipped_unit = get_exclude_unit(get_source_path(context, skipped_plan["exclude"]["from"]))
+                        change_exclude_unit(event_sources, unit_excludes, changed_units, skipped_unit)
+            context["trace"] = exclude_key
+
+    print(
+        f"{global_context['active_event']}: computed the ids of {computed_steps} of {len(step_ids)} steps again, "
+        f"filtered {len(changed_units)} tables again"
+    )
+
+    changed_sources = {"areas": base_sources["areas"], "xdt": copy(base_sources["xdt"])}
+    for unit in changed_units:
+        rows = get_path(event_sources.sources, unit)
+
+        if unit == (("areas", None),):
+            changed_sources["areas"] = rows
+        elif len(unit) == 2 and rows is not None:
+            changed_sources["xdt"][unit[1][0]] = rows
+
+    return changed_sources, ids_failed
+
+
+def write_filter_profile(profile_path: Path, build: str, step_stats: list[dict]):
+    by_step_name = defaultdict(lambda: {"runs": 0, "seconds": 0.0, "rows_scanned": 0, "rows_excluded": 0})
+
+    # the same template step runs under many categories, e.g. step_mission_data under every item type
+    for stat in step_stats:
+        step_name = stat["trace"].rsplit(".", 1)[-1]
+        by_step_name[step_name]["runs"] += 1
+        by_step_name[step_name]["seconds"] += stat["seconds"]
+        by_step_name[step_name]["rows_scanned"] += stat.get("ids_rows_scanned", 0) + stat.get("exclude_rows_scanned", 0)
+        by_step_name[step_name]["rows_excluded"] += stat.get("rows_excluded", 0)
+
+    report = {
+        "build": build,
+        "seconds": sum(stat["seconds"] for stat in step_stats),
+        "by_step_name": dict(sorted(by_step_name.items(), key=lambda item: item[1]["seconds"], reverse=True)),
+        "slowest_steps": sorted(step_stats, key=lambda stat: stat["seconds"], reverse=True),
+    }
+
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(profile_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def load_filter_config(config_how_path: Path, config_exclude_path: Path, config_extras_path: Path) -> Optional[dict]:
+    if not config_how_path.is_file() or not config_exclude_path.is_file():
+        return None
+
     all_config = {}
 
     with open(config_how_path, "r") as f:
@@ -408,37 +965,319 @@ def filter_game_info(config_how_path: Path, config_exclude_path: Path, config_ex
         with open(config_extras_path, "r") as f:
             all_config["extras"] = yaml.safe_load(f)
 
-    with open(out_areas_path, "r") as f:
-        in_areas = json.load(f)
+    return all_config
+
+
+def get_extras_events(extras_config: dict) -> list[str]:
+    # the sources without any event come first, then every event of the extras in the order they appear
+    events = ["None"]
+
+    for key in ["extra_npcs", "extra_mobs", "extra_eggs"]:
+        for extras_dict in extras_config.get(key, {}).values():
+            if extras_dict["event_name"] not in events:
+                events.append(extras_dict["event_name"])
+
+    return events
+
+
+def get_event_tables(base_sources: dict[str, Any], event_sources: dict[str, Any]) -> dict[str, Any]:
+    # only what the extras of the event change, the rest is taken from the sources without an event
+    event_tables = {
+        "xdt": {
+            table: rows
+            for table, rows in event_sources["xdt"].items()
+            if not (rows is base_sources["xdt"].get(table) or rows == base_sources["xdt"].get(table))
+        },
+    }
+
+    if event_sources["areas"] != base_sources["areas"]:
+        event_tables["areas"] = event_sources["areas"]
+
+    return event_tables
+
+
+def apply_event_tables(base_sources: dict[str, Any], event_tables: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "areas": event_tables.get("areas", base_sources["areas"]),
+        "xdt": {**base_sources["xdt"], **event_tables["xdt"]},
+    }
+
+
+def filter_sources(
+    all_config: dict,
+    all_sources: dict,
+    out_dir: Path,
+    active_event: str,
+    plan_cache_dir: Optional[Path] = None,
+    profile_path: Optional[Path] = None,
+    excluded_files: Optional[set[Path]] = None,
+    ids_cache_dir: Optional[Path] = None,
+    sources_digest: Optional[str] = None,
+) -> dict[str, Any]:
+    if active_event == ALL_EVENTS:
+        return filter_all_event_sources(
+            all_config, all_sources, out_dir, plan_cache_dir, profile_path, excluded_files, ids_cache_dir, sources_digest
+        )
+
+    # the ids are only cached for sources with a digest, hashing the parsed sources would cost as much as the steps
+    ids_path = ids_cache_dir / f"{out_dir.name}.pkl" if ids_cache_dir and sources_digest else None
+    # the unfiltered sources are never written, so their columns stay valid for every step
+    modified_sources, _, _ = filter_event_sources(
+        all_config,
+        all_sources,
+        out_dir,
+        active_event,
+        plan_cache_dir,
+        profile_path,
+        excluded_files,
+        ids_path,
+        sources_digest,
+        ColumnCache(),
+    )
+    return modified_sources
+
+
+def filter_all_event_sources(
+    all_config: dict,
+    all_sources: dict,
+    out_dir: Path,
+    plan_cache_dir: Optional[Path],
+    profile_path: Optional[Path],
+    excluded_files: Optional[set[Path]],
+    ids_cache_dir: Optional[Path],
+    sources_digest: Optional[str],
+) -> dict[str, Any]:
+    # the extras of one event may keep rows the other events exclude, so every event gets its own variant,
+    # but only the steps and tables the extras of the event change are filtered again
+    plan = load_filter_plan(all_config["how"], plan_cache_dir)
+    # the unfiltered sources are never written, so their columns stay valid for every event
+    column_cache = ColumnCache()
+    events = get_extras_events(all_config["extras"])
+    event_excluded_files = {event: set() for event in events}
+    ids_paths = {
+        event: ids_cache_dir / f"{out_dir.name}{'' if event == 'None' else f'-{event.lower()}'}.pkl"
+        if ids_cache_dir and sources_digest else None
+        for event in events
+    }
 
-    with open(out_xdt_path, "r") as f:
-        in_xdt = json.load(f)
+    base_sources, base_ids, base_stats = filter_event_sources(
+        all_config,
+        all_sources,
+        out_dir,
+        "None",
+        plan_cache_dir,
+        profile_path,
+        event_excluded_files["None"],
+        ids_paths["None"],
+        sources_digest,
+        column_cache,
+    )
+    event_tables = {}
+
+    for event in events[1:]:
+        global_context = {
+            "out_dir": str(out_dir),
+            "trace": "",
+            "active_event": event,
+            "excluded_files": event_excluded_files[event],
+        }
+        step_ids, fingerprint = load_cached_ids(all_config, ids_paths[event], sources_digest, event)
+        ids_cached = bool(step_ids)
+
+        event_sources, ids_failed = run_event_steps(
+            global_context, all_sources, base_sources, all_config, plan, base_ids, base_stats, step_ids, column_cache
+        )
+        event_tables[event] = get_event_tables(base_sources, event_sources)
+
+        if fingerprint is not None and not ids_cached and not ids_failed:
+            save_filter_ids(ids_paths[event], fingerprint, step_ids)
+
+    # files are only left out when no event keeps them
+    common_excluded_files = set.intersection(*event_excluded_files.values())
+    if excluded_files is not None:
+        excluded_files.update(common_excluded_files)
+    else:
+        remove_files(out_dir, common_excluded_files)
+
+    return {
+        **base_sources,
+        "events": event_tables,
+    }
 
+
+def load_cached_ids(
+    all_config: dict, ids_path: Optional[Path], sources_digest: Optional[str], active_event: str
+) -> tuple[dict[str, set[Any]], Optional[str]]:
+    if ids_path is None:
+        return {}, None
+
+    fingerprint = get_filter_ids_fingerprint(all_config, sources_digest, active_event)
+    step_ids = load_filter_ids(ids_path, fingerprint)
+
+    if step_ids:
+        print(f"{ids_path.stem}: reusing the cached ids of {len(step_ids)} steps")
+
+    return step_ids, fingerprint
+
+
+def filter_event_sources(
+    all_config: dict,
+    all_sources: dict,
+    out_dir: Path,
+    active_event: str,
+    plan_cache_dir: Optional[Path],
+    profile_path: Optional[Path],
+    excluded_files: Optional[set[Path]],
+    ids_path: Optional[Path],
+    sources_digest: Optional[str],
+    column_cache: ColumnCache,
+) -> tuple[dict[str, Any], dict[str, set[Any]], list[dict]]:
     global_context = {
         "out_dir": str(out_dir),
         "trace": "",
         "active_event": active_event,
+        "excluded_files": excluded_files,
     }
-    all_sources = {
-        "areas": in_areas,
-        "xdt": in_xdt,
-    }
-    modified_sources = run_all_steps(global_context, all_sources, all_config)
+    plan = load_filter_plan(all_config["how"], plan_cache_dir)
+    step_ids, fingerprint = load_cached_ids(all_config, ids_path, sources_digest, active_event)
+
+    ids_cached = bool(step_ids)
+    modified_sources, step_stats = run_all_steps(global_context, all_sources, all_config, plan, step_ids, column_cache)
+
+    # a step that failed before its ids were known would be cached as excluding nothing
+    ids_failed = any("error" in stat and "ids" not in stat for stat in step_stats)
+    if fingerprint is not None and not ids_cached and not ids_failed:
+        save_filter_ids(ids_path, fingerprint, step_ids)
+
+    if profile_path is not None:
+        write_filter_profile(profile_path, out_dir.name, step_stats)
+
+    return modified_sources, step_ids, step_stats
+
+
+def read_sources(in_dir: Path) -> tuple[dict[str, Any], str]:
+    sources = {}
+    hasher = hashlib.sha256()
+
+    # the digest of the files read stands in for the parsed sources
+    for key in ["areas", "xdt"]:
+        data = (in_dir / f"{key}.json").read_bytes()
+        hasher.update(hashlib.sha256(data).digest())
+        sources[key] = json.loads(data)
 
-    with open(out_areas_path, "w") as f:
-        json.dump(modified_sources["areas"], f, indent=4)
+    return sources, hasher.hexdigest()
 
-    with open(out_xdt_path, "w") as f:
-        json.dump(modified_sources["xdt"], f, indent=4)
 
+def write_filtered_sources(out_dir: Path, sources: dict[str, Any]):
+    with open(out_dir / "areas.json", "w") as f:
+        json.dump(sources["areas"], f, indent=4)
 
-def main(config_root: Path, in_root: Path, out_root: Path):
+    with open(out_dir / "xdt.json", "w") as f:
+        json.dump(sources["xdt"], f, indent=4)
+
+    # the tables of every event variant that differ from the ones above, see filter_all_event_sources
+    for event, event_tables in sources.get("events", {}).items():
+        with open(out_dir / f"tables-{event.lower()}.json", "w") as f:
+            json.dump(event_tables, f, indent=4)
+
+
+def link_file(in_path: Path, out_path: Path, link_mode: str):
+    try:
+        if link_mode == "hardlink":
+            os.link(in_path, out_path)
+        else:
+            import fcntl
+
+            with open(in_path, "rb") as f_in, open(out_path, "wb") as f_out:
+                fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+        return
+    except (ImportError, OSError):
+        # another device, or a filesystem without links or reflinks
+        pass
+
+    out_path.unlink(missing_ok=True)
+    shutil.copy2(in_path, out_path)
+
+
+def link_build_dir(in_dir: Path, out_dir: Path, skipped_files: set[Path], link_mode: str):
+    for in_path in in_dir.rglob("*"):
+        rel_path = in_path.relative_to(in_dir)
+
+        if in_path.is_dir():
+            (out_dir / rel_path).mkdir(parents=True, exist_ok=True)
+        elif rel_path not in skipped_files:
+            (out_dir / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            link_file(in_path, out_dir / rel_path, link_mode)
+
+
+def filter_game_info(
+    config_how_path: Path,
+    config_exclude_path: Path,
+    config_extras_path: Path,
+    in_dir: Path,
+    out_dir: Path,
+    active_event: str,
+    plan_cache_dir: Optional[Path] = None,
+    profile_path: Optional[Path] = None,
+    link_mode: Optional[str] = None,
+    ids_cache_dir: Optional[Path] = None,
+    in_sources: Optional[dict] = None,
+    sources_digest: Optional[str] = None,
+) -> Optional[dict[str, Any]]:
+    if link_mode is None:
+        shutil.copytree(in_dir, out_dir)
+    else:
+        out_dir.mkdir(parents=True)
+
+    all_config = load_filter_config(config_how_path, config_exclude_path, config_extras_path)
+
+    if all_config is None:
+        if link_mode is not None:
+            link_build_dir(in_dir, out_dir, set(), link_mode)
+        return in_sources
+
+    # the areas and xdt of in_dir can be handed over already parsed, with the digest from read_sources, they are not modified
+    if in_sources is None:
+        in_sources, sources_digest = read_sources(in_dir)
+
+    excluded_files = set() if link_mode is not None else None
+    modified_sources = filter_sources(
+        all_config,
+        in_sources,
+        out_dir,
+        active_event,
+        plan_cache_dir,
+        profile_path,
+        excluded_files,
+        ids_cache_dir,
+        sources_digest,
+    )
+
+    if link_mode is not None:
+        # the filtered tables are written fresh, a link would write them through to the input
+        link_build_dir(in_dir, out_dir, excluded_files | {Path("areas.json"), Path("xdt.json")}, link_mode)
+
+    write_filtered_sources(out_dir, modified_sources)
+    return modified_sources
+
+
+def main(
+    config_root: Path,
+    in_root: Path,
+    out_root: Path,
+    cache_root: Optional[Path] = None,
+    profile_root: Optional[Path] = None,
+    link_mode: Optional[str] = None,
+):
     in_dirs = [p for p in in_root.iterdir() if p.is_dir()]
     out_root.mkdir(parents=True, exist_ok=True)
 
     config_exclude_how_path = config_root / "how-exclude.yml"
     config_build_path = config_root / "build-config.yml"
 
+    plan_cache_dir = cache_root / "filter-plans" if cache_root else None
+    ids_cache_dir = cache_root / "filter-ids" if cache_root else None
+
     with open(config_build_path, "r") as f:
         config_build = yaml.safe_load(f)["config"]
 
@@ -447,12 +1286,43 @@ def main(config_root: Path, in_root: Path, out_root: Path):
         active_event = config_build[in_dir.name].get("active_event", "None")
         config_exclude_path = config_root / f"exclude-{in_dir.name}.yml"
         config_extras_path = config_root / f"extras-{in_dir.name}.yml"
-        filter_game_info(config_exclude_how_path, config_exclude_path, config_extras_path, in_dir, out_dir, active_event)
+        profile_path = profile_root / f"{in_dir.name}.json" if profile_root else None
+        filter_game_info(
+            config_exclude_how_path,
+            config_exclude_path,
+            config_extras_path,
+            in_dir,
+            out_dir,
+            active_event,
+            plan_cache_dir,
+            profile_path,
+            link_mode,
+            ids_cache_dir,
+        )
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python filter_game_info.py <config_root> <in_root> <out_root>")
-        sys.exit(1)
-
-    main(*map(Path, sys.argv[1:]))
+    parser = argparse.ArgumentParser(description="Remove the excluded entries of every build from its extracted info.")
+    parser.add_argument("config_root", type=Path)
+    parser.add_argument("in_root", type=Path)
+    parser.add_argument("out_root", type=Path)
+    parser.add_argument(
+        "cache_root",
+        type=Path,
+        nargs="?",
+        help="keeps compiled filter plans in <cache_root>/filter-plans and the excluded ids of every build in <cache_root>/filter-ids",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="PROFILE_ROOT",
+        help="write the time, rows and ids of every filter step to <PROFILE_ROOT>/<build>.json",
+    )
+    parser.add_argument(
+        "--link",
+        choices=LINK_MODES,
+        help="fill <out_root> with links to the kept input files instead of copying every build and deleting excluded icons",
+    )
+    args = parser.parse_args()
+
+    main(args.config_root, args.in_root, args.out_root, args.cache_root, args.profile, args.link)
@@ -0,0 +1,181 @@
+import sys
+import json
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+import yaml
+
+from zip_all_info import MANIFEST_NAME, get_change_log_line
+from extract_derived_info import get_server_data_commit
+
+REPO_RELEASE_URL = "https://github.com/FinnHornhoover/FFInfoPacks/releases/latest/download"
+SCRIPT_ROOT = Path(__file__).parent
+# the scripts whose code each stage runs, including the ones it imports from
+# build_all.py runs every stage and hands the sources between them, so it is part of the first one
+STAGE_SCRIPTS = {
+    "extract": ["extract_game_info.py", "build_all.py"],
+    "filter": ["filter_game_info.py"],
+    "derive": ["extract_derived_info.py", "filter_game_info.py"],
+    "zip": ["zip_all_info.py"],
+}
+
+
+def get_zip_name(build: str, build_config: dict[str, Any]) -> str:
+    nickname = f"_{build_config['nickname']}" if "nickname" in build_config else ""
+    return f"{build}_r{build_config['revision']}{nickname}.zip"
+
+
+def hash_file(path: Path) -> Optional[str]:
+    if not path.is_file():
+        return None
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def get_build_fingerprints(
+    build: str,
+    build_config: dict[str, Any],
+    config_root: Path,
+    asset_root: Path,
+    server_data_root: Path,
+) -> dict[str, Optional[str]]:
+    # each stage covers the stages before it, so equal zip fingerprints mean equal zip contents
+    active_event = build_config.get("active_event", "None")
+    server_data_config = build_config["server-data"]
+    commit = get_server_data_commit(server_data_root / server_data_config["repository"].strip("/"))
+    script_hashes = {stage: [hash_file(SCRIPT_ROOT / name) for name in names] for stage, names in STAGE_SCRIPTS.items()}
+
+    fingerprints = {}
+    fingerprints["extract"] = fingerprint(
+        build,
+        {resource: hash_file(asset_root / build / resource) for resource in build_config["resources"]},
+        hash_file(SCRIPT_ROOT.parent / "requirements.txt"),
+        script_hashes["extract"],
+    )
+    fingerprints["filter"] = fingerprint(
+        fingerprints["extract"],
+        active_event,
+        hash_file(config_root / "how-exclude.yml"),
+        hash_file(config_root / f"exclude-{build}.yml"),
+        hash_file(config_root / f"extras-{build}.yml"),
+        script_hashes["filter"],
+    )
+    # uncommitted server data cannot be fingerprinted, so the build is always derived again
+    fingerprints["derive"] = fingerprint(
+        fingerprints["filter"],
+        server_data_config["repository"],
+        commit,
+        server_data_config.get("patches", []),
+        script_hashes["derive"],
+    ) if commit else None
+    fingerprints["zip"] = fingerprint(
+        fingerprints["derive"],
+        script_hashes["zip"],
+    ) if fingerprints["derive"] else None
+
+    return fingerprints
+
+
+def plan_build(fingerprints: dict[str, Optional[str]], previous_entry: Optional[dict[str, Any]]) -> str:
+    if not previous_entry:
+        return "build"
+
+    previous_fingerprints = previous_entry["fingerprints"]
+
+    if fingerprints["zip"] and fingerprints["zip"] == previous_fingerprints.get("zip"):
+        return "reuse"
+
+    # the previous zip holds the filtered files but not the extracted ones, so extract and filter are skipped together
+    if fingerprints["filter"] == previous_fingerprints.get("filter"):
+        return "derive"
+
+    return "build"
+
+
+def download_previous_zip(client: httpx.Client, zip_name: str, path: Path):
+    with client.stream("GET", f"{REPO_RELEASE_URL}/{zip_name}") as stream:
+        stream.raise_for_status()
+
+        with open(path, "wb") as f:
+            for chunk in stream.iter_bytes(chunk_size=(1 << 16)):
+                f.write(chunk)
+
+
+def load_previous_manifest(client: httpx.Client) -> dict[str, Any]:
+    response = client.get(f"{REPO_RELEASE_URL}/{MANIFEST_NAME}")
+
+    if response.status_code == 404:
+        return {"builds": {}}
+
+    response.raise_for_status()
+    return response.json()
+
+
+def main(config_root: Path, asset_root: Path, output_root: Path, artifact_root: Path, server_data_root: Path):
+    with open(config_root / "build-config.yml", "r") as f:
+        config = yaml.safe_load(f)["config"]
+
+    manifest = {"builds": {}}
+    output_root.mkdir(parents=True, exist_ok=True)
+
+    with httpx.Client(timeout=httpx.Timeout(None), follow_redirects=True) as client:
+        previous_manifest = load_previous_manifest(client)
+
+        for build, build_config in config.items():
+            zip_name = get_zip_name(build, build_config)
+            previous_entry = previous_manifest["builds"].get(build)
+            asset_dir = asset_root / build
+
+            # the zip of this revision is already released and was downloaded as is
+            if not asset_dir.is_dir():
+                if previous_entry and previous_entry["zip"] == zip_name:
+                    # announced when it was first released
+                    manifest["builds"][build] = {key: value for key, value in previous_entry.items() if key != "change_log"}
+                continue
+
+            fingerprints = get_build_fingerprints(build, build_config, config_root, asset_root, server_data_root)
+            action = plan_build(fingerprints, previous_entry)
+
+            if action == "reuse":
+                download_previous_zip(client, previous_entry["zip"], artifact_root / zip_name)
+                shutil.rmtree(asset_dir)
+            elif action == "derive":
+                temp_zip_path = artifact_root / previous_entry["zip"]
+                download_previous_zip(client, previous_entry["zip"], temp_zip_path)
+                shutil.unpack_archive(temp_zip_path, output_root / build, "zip")
+                # info and every info-<event> folder, so that nothing the derivation no longer writes is shipped again
+                for info_dir in (output_root / build).glob("info*"):
+                    if info_dir.is_dir():
+                        shutil.rmtree(info_dir)
+                temp_zip_path.unlink()
+                shutil.rmtree(asset_dir)
+
+            print(f"{build}: {action}" + (f" from {previous_entry['zip']}" if action != "build" else ""))
+            manifest["builds"][build] = {"revision": build_config["revision"], "zip": zip_name, "fingerprints": fingerprints}
+
+            # reused zips skip build_all, so their line is merged into the change log from here
+            if action == "reuse":
+                manifest["builds"][build]["change_log"] = get_change_log_line(build, build_config)
+
+    with open(artifact_root / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 6:
+        print("Usage: python plan_builds.py <config_root> <asset_root> <output_root> <artifact_root> <server_data_root>")
+        sys.exit(1)
+
+    main(*map(Path, sys.argv[1:]))
@@ -0,0 +1,207 @@
+import time
+import shutil
+import argparse
+import traceback
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from filter_game_info import filter_game_info, read_sources
+from extract_derived_info import SERVER_DATA_NAMES, derive_build
+
+STAGES = ["filter", "derive"]
+
+
+def load_build_config(config_root: Path) -> dict:
+    with open(config_root / "build-config.yml", "r") as f:
+        return yaml.safe_load(f)["config"]
+
+
+def get_watched_paths(config_root: Path, server_data_root: Path, config: dict, builds: list[str]) -> dict[Path, dict[str, str]]:
+    # every file a build reads, with the first stage that has to run again when it changes
+    watched = defaultdict(dict)
+
+    for build in builds:
+        for name in ["how-exclude.yml", f"exclude-{build}.yml", f"extras-{build}.yml"]:
+            watched[config_root / name][build] = "filter"
+
+        server_data_config = config[build]["server-data"]
+        server_data_dir = server_data_root / server_data_config["repository"].strip("/")
+
+        for name in SERVER_DATA_NAMES.values():
+            watched[server_data_dir / f"{name}.json"][build] = "derive"
+
+            for patch_name in server_data_config.get("patches", []):
+                watched[server_data_dir / "patch" / patch_name / f"{name}.json"][build] = "derive"
+
+    return watched
+
+
+def get_mtimes(paths: list[Path]) -> dict[Path, Optional[int]]:
+    mtimes = {}
+
+    for path in paths:
+        try:
+            mtimes[path] = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            # files that appear or disappear count as changes too
+            mtimes[path] = None
+
+    return mtimes
+
+
+def rebuild(
+    build: str,
+    first_stage: str,
+    config_root: Path,
+    build_config: dict,
+    in_dir: Path,
+    out_dir: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path],
+    state: dict,
+):
+    start = time.perf_counter()
+
+    if first_stage == "filter":
+        state["filtered"] = None
+        # linked again from the input, so that icons excluded before but kept now come back
+        shutil.rmtree(out_dir, ignore_errors=True)
+        state["filtered"] = filter_game_info(
+            config_root / "how-exclude.yml",
+            config_root / f"exclude-{build}.yml",
+            config_root / f"extras-{build}.yml",
+            in_dir,
+            out_dir,
+            build_config.get("active_event", "None"),
+            cache_root / "filter-plans" if cache_root else None,
+            None,
+            "hardlink",
+            cache_root / "filter-ids" if cache_root else None,
+            state["sources"],
+            state["digest"],
+        )
+
+    derive_build(
+        config_root,
+        build_config,
+        out_dir,
+        server_data_root,
+        cache_root,
+        stage_cache=cache_root is not None,
+        build_sources=state["filtered"],
+    )
+    print(f"{build}: {' and '.join(STAGES[STAGES.index(first_stage):])} done in {time.perf_counter() - start:.1f}s")
+
+
+def main(
+    config_root: Path,
+    in_root: Path,
+    out_root: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path] = None,
+    builds: Optional[list[str]] = None,
+    interval: float = 1.0,
+):
+    config = load_build_config(config_root)
+    builds = builds or sorted(p.name for p in in_root.iterdir() if p.is_dir() and p.name in config)
+    out_root.mkdir(parents=True, exist_ok=True)
+
+    # the extracted tables are parsed once, only the configs and the server data are read again on a change
+    states = {}
+    for build in builds:
+        sources, digest = read_sources(in_root / build)
+        states[build] = {"sources": sources, "digest": digest, "filtered": None}
+
+    config_path = config_root / "build-config.yml"
+    watched = get_watched_paths(config_root, server_data_root, config, builds)
+    mtimes = get_mtimes([config_path, *watched])
+    pending = dict.fromkeys(builds, "filter")
+
+    while True:
+        for build, first_stage in pending.items():
+            # a build whose filter failed has nothing to derive from
+            if states[build]["filtered"] is None:
+                first_stage = "filter"
+
+            try:
+                rebuild(
+                    build,
+                    first_stage,
+                    config_root,
+                    config[build],
+                    in_root / build,
+                    out_root / build,
+                    server_data_root,
+                    cache_root,
+                    states[build],
+                )
+            except Exception:
+                print(f"{build}: failed, waiting for the next change")
+                traceback.print_exc()
+
+        pending = {}
+        print(f"Watching {len(mtimes)} files for changes...")
+
+        while not pending:
+            time.sleep(interval)
+            new_mtimes = get_mtimes([config_path, *watched])
+            changed = [path for path, mtime in new_mtimes.items() if mtime != mtimes.get(path)]
+            mtimes = new_mtimes
+
+            if config_path in changed:
+                try:
+                    new_config = load_build_config(config_root)
+                    new_watched = get_watched_paths(config_root, server_data_root, new_config, builds)
+                except Exception:
+                    print("build-config.yml could not be loaded, keeping the previous one")
+                    traceback.print_exc()
+                    continue
+
+                pending.update((build, "filter") for build in builds if new_config.get(build) != config.get(build))
+                config, watched = new_config, new_watched
+                # patches added to a build are watched from now on
+                mtimes = get_mtimes([config_path, *watched])
+
+            for path in changed:
+                for build, stage in watched.get(path, {}).items():
+                    # filtering again covers the derivation too
+                    if pending.get(build) != "filter":
+                        pending[build] = stage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep the extracted builds in memory and filter and derive them again whenever their configs or server data change."
+    )
+    parser.add_argument("config_root", type=Path)
+    parser.add_argument("in_root", type=Path)
+    parser.add_argument("out_root", type=Path)
+    parser.add_argument("server_data_root", type=Path)
+    parser.add_argument(
+        "cache_root",
+        type=Path,
+        nargs="?",
+        help="reuse filter plans, excluded ids and unchanged derivation stages from <cache_root>",
+    )
+    parser.add_argument(
+        "--build",
+        action="append",
+        dest="builds",
+        metavar="BUILD",
+        help="only watch this build, can be repeated (default: every build in <in_root>)",
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks for changed files")
+    args = parser.parse_args()
+
+    main(
+        args.config_root,
+        args.in_root,
+        args.out_root,
+        args.server_data_root,
+        args.cache_root,
+        args.builds,
+        args.interval,
+    )
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import shutil
+import socket
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+import zip_all_info
+from build_all import STAGES, extract_stage, filter_stage, derive_stage, zip_stage, run_timed, get_build_weight, format_gantt
+
+QUEUE_DIRS = ["pending", "claimed", "done", "failed", "inputs", "artifacts"]
+HEARTBEAT_INTERVAL = 60
+CLOCK_PROBE_NAME = ".clock"
+# every build ever queued, so that collect can tell a build that dropped out of the queue from one that was never in it
+ENQUEUED_NAME = "enqueued.json"
+
+
+def write_json_atomic(path: Path, obj: dict):
+    # readers on other hosts only ever see complete files
+    temp_path = path.with_name(f".{path.name}.tmp")
+
+    with open(temp_path, "w") as f:
+        json.dump(obj, f, indent=4)
+
+    os.replace(temp_path, path)
+
+
+def enqueue(queue_root: Path, asset_root: Path, output_root: Path):
+    for name in QUEUE_DIRS:
+        (queue_root / name).mkdir(parents=True, exist_ok=True)
+
+    enqueued_path = queue_root / ENQUEUED_NAME
+    enqueued = set()
+    if enqueued_path.is_file():
+        with open(enqueued_path, "r") as f:
+            enqueued.update(json.load(f)["builds"])
+
+    tasks = []
+
+    if asset_root.is_dir():
+        tasks.extend((p, "assets", STAGES) for p in asset_root.iterdir() if p.is_dir())
+
+    # builds restored from a previous zip by the planner only need their info derived again
+    if output_root.is_dir():
+        tasks.extend((p, "output", STAGES[2:]) for p in output_root.iterdir() if p.is_dir())
+
+    for build_dir, input_name, stages in tasks:
+        build = build_dir.name
+        weight = get_build_weight(build_dir)
+        shutil.move(build_dir, queue_root / "inputs" / build / input_name)
+        write_json_atomic(queue_root / "pending" / f"{build}.json", {"build": build, "stages": stages, "weight": weight})
+        enqueued.add(build)
+        print(f"{build}: queued {', '.join(stages)}")
+
+    write_json_atomic(enqueued_path, {"builds": sorted(enqueued)})
+
+
+def get_queue_time(queue_root: Path) -> float:
+    # heartbeats are stamped by the clock of the filesystem holding the queue, which may differ from the one of this host
+    probe_path = queue_root / CLOCK_PROBE_NAME
+    probe_path.touch()
+    return probe_path.stat().st_mtime
+
+
+def requeue_stale_claims(queue_root: Path, stale_after: float):
+    now = get_queue_time(queue_root)
+
+    for claim_path in (queue_root / "claimed").glob("*.json"):
+        try:
+            if now - claim_path.stat().st_mtime < stale_after:
+                continue
+
+            build = claim_path.name.split(".", 1)[0]
+            os.rename(claim_path, queue_root / "pending" / f"{build}.json")
+        except FileNotFoundError:
+            # finished or requeued by someone else in the meantime
+            continue
+
+        print(f"{build}: requeued, the claim stopped sending heartbeats")
+
+
+def claim_task(queue_root: Path, worker_id: str) -> Optional[tuple[Path, dict]]:
+    pending = []
+
+    for task_path in (queue_root / "pending").glob("*.json"):
+        try:
+            with open(task_path, "r") as f:
+                pending.append((json.load(f), task_path))
+        except FileNotFoundError:
+            continue
+
+    # heaviest first, like the local scheduler
+    for task, task_path in sorted(pending, key=lambda pair: pair[0]["weight"], reverse=True):
+        claim_path = queue_root / "claimed" / f"{task['build']}.{worker_id}.json"
+
+        # rename is atomic, so exactly one worker wins every task
+        try:
+            os.rename(task_path, claim_path)
+        except FileNotFoundError:
+            continue
+
+        # the rename keeps the time the task was queued, which would make the claim look stale right away
+        os.utime(claim_path)
+        return claim_path, task
+
+    return None
+
+
+def send_heartbeats(claim_path: Path, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            os.utime(claim_path)
+        except FileNotFoundError:
+            return
+
+
+def run_task(
+    task: dict,
+    queue_root: Path,
+    work_root: Path,
+    config_root: Path,
+    config: dict,
+    server_data_root: Path,
+    cache_root: Optional[Path],
+    low_memory: bool,
+    stage_cache: bool,
+) -> tuple[str, list[tuple[str, str, float, float]]]:
+    build = task["build"]
+    build_config = config[build]
+    inputs_dir = queue_root / "inputs" / build
+    out_dir = work_root / build
+    local_artifact_root = work_root / "artifacts" / build
+    shutil.rmtree(out_dir, ignore_errors=True)
+    shutil.rmtree(local_artifact_root, ignore_errors=True)
+    local_artifact_root.mkdir(parents=True)
+
+    if "extract" not in task["stages"]:
+        shutil.copytree(inputs_dir / "output", out_dir)
+
+    timings = []
+    result = None
+
+    for stage in task["stages"]:
+        if stage == "extract":
+            args = (extract_stage, inputs_dir / "assets", out_dir)
+        elif stage == "filter":
+            args = (filter_stage, config_root, build_config, out_dir, cache_root, None, result)
+        elif stage == "derive":
+            args = (derive_stage, config_root, build_config, out_dir, server_data_root, cache_root, low_memory, stage_cache, result)
+        else:
+            args = (zip_stage, build_config, out_dir, local_artifact_root)
+
+        start, end, result = run_timed(*args)
+        timings.append((build, stage, start, end))
+
+    # the zip is copied next to its final name first, so that the queue never holds a partial zip
+    for zip_path in local_artifact_root.glob("*.zip"):
+        temp_path = queue_root / "artifacts" / f".{zip_path.name}.tmp"
+        shutil.copyfile(zip_path, temp_path)
+        os.replace(temp_path, queue_root / "artifacts" / zip_path.name)
+
+    shutil.rmtree(local_artifact_root)
+    shutil.rmtree(out_dir)
+    return result, timings
+
+
+def work(
+    queue_root: Path,
+    work_root: Path,
+    config_root: Path,
+    server_data_root: Path,
+    cache_root: Optional[Path] = None,
+    low_memory: bool = False,
+    stage_cache: bool = False,
+    worker_id: Optional[str] = None,
+    stale_after: float = 10 * HEARTBEAT_INTERVAL,
+):
+    with open(config_root / "build-config.yml", "r") as f:
+        config = yaml.safe_load(f)["config"]
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    while True:
+        requeue_stale_claims(queue_root, stale_after)
+        claimed = claim_task(queue_root, worker_id)
+
+        if claimed is None:
+            # claims of other workers can still go stale, and someone has to pick them up again
+            if not any((queue_root / "claimed").glob("*.json")):
+                break
+
+            time.sleep(HEARTBEAT_INTERVAL)
+            continue
+
+        claim_path, task = claimed
+        build = task["build"]
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=send_heartbeats, args=(claim_path, stop), daemon=True)
+        heartbeat.start()
+        print(f"{build}: claimed by {worker_id}")
+
+        try:
+            change_log_line, timings = run_task(
+                task, queue_root, work_root, config_root, config, server_data_root, cache_root, low_memory, stage_cache
+            )
+            write_json_atomic(
+                queue_root / "done" / f"{build}.json",
+                {"build": build, "worker": worker_id, "change_log": change_log_line, "timings": timings},
+            )
+        except Exception:
+            write_json_atomic(
+                queue_root / "failed" / f"{build}.json",
+                {"build": build, "worker": worker_id, "error": traceback.format_exc()},
+            )
+            print(f"{build}: failed on {worker_id}")
+            traceback.print_exc()
+        except BaseException:
+            # interrupted before anything was recorded, so the build goes back to the queue instead of dropping out of it
+            stop.set()
+            heartbeat.join()
+            try:
+                os.rename(claim_path, queue_root / "pending" / f"{build}.json")
+                print(f"{build}: requeued, {worker_id} was interrupted")
+            except FileNotFoundError:
+                # already requeued as stale
+                pass
+            raise
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        # only released once the build is in done or failed
+        claim_path.unlink(missing_ok=True)
+
+
+def collect(queue_root: Path, artifact_root: Path):
+    unfinished = [p.name for name in ["pending", "claimed"] for p in (queue_root / name).glob("*.json")]
+    if unfinished:
+        raise RuntimeError(f"Builds are still queued or running: {', '.join(sorted(unfinished))}")
+
+    failed = sorted(p.stem for p in (queue_root / "failed").glob("*.json"))
+    if failed:
+        raise RuntimeError(f"Builds failed, see {queue_root / 'failed'}: {', '.join(failed)}")
+
+    with open(queue_root / ENQUEUED_NAME, "r") as f:
+        enqueued = set(json.load(f)["builds"])
+
+    missing = sorted(enqueued - {p.stem for p in (queue_root / "done").glob("*.json")})
+    if missing:
+        raise RuntimeError(f"Builds were queued but never finished: {', '.join(missing)}")
+
+    artifact_root.mkdir(parents=True, exist_ok=True)
+    change_log = []
+    timings = []
+
+    for done_path in (queue_root / "done").glob("*.json"):
+        with open(done_path, "r") as f:
+            done = json.load(f)
+
+        change_log.append(done["change_log"])
+        timings.extend(tuple(timing) for timing in done["timings"])
+
+    for zip_path in (queue_root / "artifacts").glob("*.zip"):
+        shutil.move(zip_path, artifact_root / zip_path.name)
+
+    zip_all_info.write_change_log(artifact_root, change_log)
+    print(format_gantt(timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share the build chain between hosts through a directory-based work queue.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="move the downloaded builds into the queue")
+    enqueue_parser.add_argument("queue_root", type=Path)
+    enqueue_parser.add_argument("asset_root", type=Path)
+    enqueue_parser.add_argument("output_root", type=Path)
+
+    work_parser = subparsers.add_parser("work", help="claim and build queued builds until none are left")
+    work_parser.add_argument("queue_root", type=Path)
+    work_parser.add_argument("work_root", type=Path)
+    work_parser.add_argument("config_root", type=Path)
+    work_parser.add_argument("server_data_root", type=Path)
+    work_parser.add_argument("cache_root", type=Path, nargs="?")
+    work_parser.add_argument("--low-memory", action="store_true", help="free intermediate data after the last stage reading it")
+    work_parser.add_argument(
+        "--stage-cache",
+        action="store_true",
+        help="reuse stage outputs from <cache_root>/stages when the inputs of the stage are unchanged",
+    )
+    work_parser.add_argument("--worker-id", help="name of this worker in the queue (default: <hostname>-<pid>)")
+    work_parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=10 * HEARTBEAT_INTERVAL,
+        help="seconds without a heartbeat after which a claimed build is queued again",
+    )
+
+    collect_parser = subparsers.add_parser("collect", help="gather the finished zips and the changelog")
+    collect_parser.add_argument("queue_root", type=Path)
+    collect_parser.add_argument("artifact_root", type=Path)
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        enqueue(args.queue_root, args.asset_root, args.output_root)
+    elif args.command == "work":
+        if args.stage_cache and not args.cache_root:
+            parser.error("stage outputs are kept in <cache_root>, which is required for --stage-cache")
+
+        work(
+            args.queue_root,
+            args.work_root,
+            args.config_root,
+            args.server_data_root,
+            args.cache_root,
+            args.low_memory,
+            args.stage_cache,
+            args.worker_id,
+            args.stale_after,
+        )
+    else:
+        collect(args.queue_root, args.artifact_root)
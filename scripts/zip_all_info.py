@@ -1,10 +1,49 @@
 import sys
+import json
 import shutil
 from pathlib import Path
 
 import yaml
 from tqdm import tqdm
 
+MANIFEST_NAME = "manifest.json"
+
+
+def get_change_log_line(build: str, build_config: dict) -> str:
+    nickname = f"_{build_config['nickname']}" if "nickname" in build_config else ""
+    revision = build_config["revision"]
+
+    return " - Build `{}`{} Revision {} is now available at `{}.zip`.".format(
+        build,
+        f" ({nickname[1:].replace('-', ' ').title()})" if nickname else "",
+        revision,
+        f"{build}_r{revision}{nickname}",
+    )
+
+
+def zip_build(build: str, build_config: dict, in_dir: Path, out_root: Path) -> str:
+    nickname = f"_{build_config['nickname']}" if "nickname" in build_config else ""
+    revision = build_config["revision"]
+
+    out_path = out_root / f"{build}_r{revision}{nickname}"
+
+    shutil.make_archive(out_path, "zip", in_dir)
+
+    return get_change_log_line(build, build_config)
+
+
+def write_change_log(out_root: Path, change_log: list[str]):
+    # builds the planner released again from their previous zip are announced too, they are never zipped here
+    manifest_path = out_root / MANIFEST_NAME
+    if manifest_path.is_file():
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+        change_log = [*change_log, *(entry["change_log"] for entry in manifest["builds"].values() if "change_log" in entry)]
+
+    with open(out_root / "changelog.txt", "w") as f:
+        f.write("\n".join(sorted(set(change_log))))
+
 
 def main(config_path: Path, in_root: Path, out_root: Path):
     with open(config_path, "r") as f:
@@ -16,25 +55,9 @@ def main(config_path: Path, in_root: Path, out_root: Path):
     in_dirs = [p for p in in_root.iterdir() if p.is_dir()]
     for in_dir in tqdm(in_dirs):
         build = in_dir.name
-        build_config = config[build]
-        nickname = f"_{build_config['nickname']}" if "nickname" in build_config else ""
-        revision = build_config["revision"]
+        change_log.append(zip_build(build, config[build], in_dir, out_root))
 
-        out_path = out_root / f"{build}_r{revision}{nickname}"
-
-        shutil.make_archive(out_path, "zip", in_dir)
-
-        change_log.append(
-            " - Build `{}`{} Revision {} is now available at `{}.zip`.".format(
-                build,
-                f" ({nickname[1:].replace('-', ' ').title()})" if nickname else "",
-                revision,
-                out_path.name,
-            )
-        )
-
-    with open(out_root / "changelog.txt", "w") as f:
-        f.write("\n".join(sorted(change_log)))
+    write_change_log(out_root, change_log)
 
 
 if __name__ == "__main__":